@@ -1,903 +1,1308 @@
-from __future__ import annotations
-import os
-
-import streamlit as st
-import pandas as pd
-import plotly.graph_objects as go
-import streamlit.components.v1 as components
-import yfinance as yf  # 抓 Yahoo 股價
-
-# 假設這些模組您本地都有，請保持不動
-from core.data_fetch import (
-    fetch_us_stock,
-    fetch_earnings_summary,
-    fetch_financial_statements,
-)
-from core.indicators import compute_indicators
-from core.ai_analyzer import (
-    generate_analysis,
-    extract_earnings_insights,
-    translate_transcript_paragraphs,
-    analyze_earnings_transcript,
-    review_question,  # 問題審查器
-)
-
-
-# ========= Google Gemini 模型選項 =========
-MODEL_OPTIONS = {
-    "⚡ Gemini 2.0 Flash（快速）": "gemini-2.0-flash",
-    "🧠 Gemini 1.5 Pro（深度推理）": "gemini-1.5-pro",
-}
-
-st.set_page_config(page_title="美股 AI 分析工具（Gemini 版）", layout="wide")
-
-
-# ========= 全域 UI 美化 (V4 終極修復版：強制白底黑字輸入框) =========
-def inject_global_css():
-    st.markdown(
-        """
-        <style>
-        /* 1. 全域設定：強制主畫面亮色背景，文字深色 */
-        .stApp {
-            background-color: #f5f7fb;
-            color: #333333 !important;
-        }
-        .main {
-            background-color: #f5f7fb;
-        }
-
-        /* 2. 標題強制深色 */
-        h1, h2, h3 {
-            font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", sans-serif;
-            color: #0f172a !important; 
-        }
-        h1 { font-weight: 700; }
-
-        /* 3. 卡片樣式 */
-        .ai-card {
-            padding: 1.1rem 1.2rem;
-            border-radius: 0.9rem;
-            background: #ffffff;
-            box-shadow: 0 6px 18px rgba(15, 23, 42, 0.08);
-            margin-bottom: 1.2rem;
-            color: #333333 !important;
-        }
-        .ai-card-title {
-            font-weight: 600;
-            font-size: 1.05rem;
-            margin-bottom: 0.6rem;
-            color: #0f172a !important;
-        }
-
-        /* 4. Expander (摺疊區) */
-        .streamlit-expanderHeader {
-            font-weight: 600;
-            color: #333333 !important;
-        }
-        .streamlit-expander {
-            border-radius: 0.75rem !important;
-            box-shadow: 0 6px 18px rgba(15, 23, 42, 0.06);
-            border: 1px solid #e2e8f0;
-            color: #333333 !important;
-            background-color: #ffffff !important;
-        }
-        .streamlit-expanderContent {
-            color: #333333 !important;
-        }
-
-        /* 5. 側邊欄：深色背景，文字淺色 */
-        section[data-testid="stSidebar"] {
-            background-color: #0f172a;
-        }
-        /* 側邊欄的一般文字預設為淺色 */
-        section[data-testid="stSidebar"] h1,
-        section[data-testid="stSidebar"] h2,
-        section[data-testid="stSidebar"] h3,
-        section[data-testid="stSidebar"] label,
-        section[data-testid="stSidebar"] span,
-        section[data-testid="stSidebar"] p,
-        section[data-testid="stSidebar"] div.stMarkdown {
-            color: #e5e7eb !important;
-        }
-
-        /* ========== 6. 關鍵修復：所有輸入框強制「白底黑字」 ========== */
-        /* 無論在側邊欄還是主畫面，輸入框一律白底，這樣就不會被深色模式影響 */
-
-        /* 下拉選單 (Selectbox) 的外框 */
-        div[data-baseweb="select"] > div {
-            background-color: #ffffff !important;
-            border-color: #d1d5db !important;
-            color: #333333 !important;
-        }
-        
-        /* 文字輸入框 (TextInput) 的外框 */
-        div[data-baseweb="input"] > div {
-            background-color: #ffffff !important;
-            border-color: #d1d5db !important;
-            color: #333333 !important;
-        }
-
-        /* 輸入框內的文字顏色 (強制深黑) */
-        div[data-baseweb="select"] div,
-        div[data-baseweb="input"] input {
-            color: #333333 !important;
-            -webkit-text-fill-color: #333333 !important; /* 相容 Safari */
-            caret-color: #333333 !important; /* 游標顏色 */
-        }
-
-        /* 下拉選單的箭頭圖示 */
-        div[data-baseweb="select"] svg {
-            fill: #333333 !important;
-        }
-
-        /* 下拉選單彈出的選項清單 (Popover) */
-        div[data-baseweb="popover"] div {
-            background-color: #ffffff !important;
-            color: #333333 !important;
-        }
-        
-        /* 表格文字 */
-        div[data-testid="stTable"] {
-            color: #333333 !important;
-        }
-        </style>
-        """,
-        unsafe_allow_html=True,
-    )
-
-
-inject_global_css()
-
-# ========= 初始化 Session State =========
-if "analyzed" not in st.session_state:
-    st.session_state["analyzed"] = False
-    st.session_state["last_symbol"] = ""
-    st.session_state["last_period"] = "3mo"
-
-
-# ========= 近一小時 or 最近收盤價 =========
-def fetch_last_1h_price(symbol: str):
-    """
-    先嘗試抓近一小時 1 分鐘線；若抓不到，改回傳最近收盤價與前一日比較。
-    回傳 dict: {last, change, pct, source}
-        source = "intraday" 或 "last_close"
-    """
-    try:
-        ticker = yf.Ticker(symbol)
-
-        # 1. 先試 intraday（可能有延遲）
-        df = ticker.history(period="2h", interval="1m")
-        if df is not None and not df.empty:
-            if len(df) >= 60:
-                last_hour = df.tail(60)
-            else:
-                last_hour = df
-
-            last = float(last_hour["Close"].iloc[-1])
-            first = float(last_hour["Close"].iloc[0])
-            pct = (last - first) / first if first != 0 else 0.0
-
-            return {
-                "last": last,
-                "change": last - first,
-                "pct": pct,
-                "source": "intraday",
-            }
-
-        # 2. 若抓不到 1 分鐘線，就改抓日線最近收盤
-        daily = ticker.history(period="5d", interval="1d")
-        if daily is None or daily.empty:
-            return None
-        last_close = float(daily["Close"].iloc[-1])
-        if len(daily) >= 2:
-            prev_close = float(daily["Close"].iloc[-2])
-        else:
-            prev_close = last_close
-        change = last_close - prev_close
-        pct = (last_close - prev_close) / prev_close if prev_close != 0 else 0.0
-
-        return {
-            "last": last_close,
-            "change": change,
-            "pct": pct,
-            "source": "last_close",
-        }
-    except Exception:
-        return None
-
-
-# ========= 最近一個交易日的 MA / Volume =========
-def fetch_last_daily_ma_volume(symbol: str):
-    """
-    抓最近一個交易日的 MA5 / MA10 / MA20 / 成交量。
-    回傳 dict: {date, ma5, ma10, ma20, volume}
-    """
-    try:
-        ticker = yf.Ticker(symbol)
-        df = ticker.history(period="3mo", interval="1d")
-        if df is None or df.empty:
-            return None
-
-        last_row = df.iloc[-1]
-        close_series = df["Close"]
-
-        def last_ma(window: int):
-            if len(close_series) >= window:
-                return float(close_series.rolling(window).mean().iloc[-1])
-            else:
-                return None
-
-        ma5 = last_ma(5)
-        ma10 = last_ma(10)
-        ma20 = last_ma(20)
-        volume = float(last_row["Volume"]) if "Volume" in last_row else None
-        date = last_row.name.strftime("%Y-%m-%d")
-
-        return {
-            "date": date,
-            "ma5": ma5,
-            "ma10": ma10,
-            "ma20": ma20,
-            "volume": volume,
-        }
-    except Exception:
-        return None
-
-
-# ========= 專業版圖表（K 線 + MA + 畫線工具 + RSI/Volume） =========
-def render_pro_chart(hist: pd.DataFrame, period: str):
-    st.subheader(f"📉 股價走勢（{period}）")
-
-    if hist is None or hist.empty:
-        st.warning("⚠ 找不到股價資料。")
-        return
-
-    required_cols = ["Open", "High", "Low", "Close"]
-    has_ohlc = all(col in hist.columns for col in required_cols)
-
-    if has_ohlc:
-        chart_type = st.radio(
-            "圖表類型",
-            ["收盤價折線圖", "K 線圖（蠟燭圖）"],
-            horizontal=True,
-        )
-    else:
-        st.info("⚠ 此股票缺少開高低收（OHLC）資料，無法顯示 K 線圖。")
-        chart_type = "收盤價折線圖"
-
-    # 是否顯示 MA 線
-    show_ma = st.checkbox("顯示 MA5 / MA10 / MA20", value=True)
-
-    # 計算 MA5 / MA10 / MA20
-    ma_df = None
-    if "Close" in hist.columns:
-        close = hist["Close"]
-        ma_df = pd.DataFrame(index=hist.index)
-        ma_df["MA5"] = close.rolling(5).mean()
-        ma_df["MA10"] = close.rolling(10).mean()
-        ma_df["MA20"] = close.rolling(20).mean()
-
-    # ---------- 建立 Plotly 圖 ----------
-    if chart_type == "收盤價折線圖":
-        fig = go.Figure()
-        fig.add_trace(
-            go.Scatter(
-                x=hist.index,
-                y=hist["Close"],
-                mode="lines",
-                name="收盤價",
-                line=dict(color="#0050b3", width=2),
-            )
-        )
-
-        if show_ma and ma_df is not None:
-            if ma_df["MA5"].notna().any():
-                fig.add_trace(
-                    go.Scatter(
-                        x=ma_df.index,
-                        y=ma_df["MA5"],
-                        mode="lines",
-                        name="MA5",
-                        line=dict(color="#ffa500", width=1.5),
-                    )
-                )
-            if ma_df["MA10"].notna().any():
-                fig.add_trace(
-                    go.Scatter(
-                        x=ma_df.index,
-                        y=ma_df["MA10"],
-                        mode="lines",
-                        name="MA10",
-                        line=dict(color="#2ca02c", width=1.3),
-                    )
-                )
-            if ma_df["MA20"].notna().any():
-                fig.add_trace(
-                    go.Scatter(
-                        x=ma_df.index,
-                        y=ma_df["MA20"],
-                        mode="lines",
-                        name="MA20",
-                        line=dict(color="#9467bd", width=1.3),
-                    )
-                )
-
-    else:
-        # K 線圖
-        try:
-            fig = go.Figure(
-                data=[
-                    go.Candlestick(
-                        x=hist.index,
-                        open=hist["Open"],
-                        high=hist["High"],
-                        low=hist["Low"],
-                        close=hist["Close"],
-                        name="K 線",
-                        increasing_line_color="green",
-                        increasing_fillcolor="green",
-                        decreasing_line_color="red",
-                        decreasing_fillcolor="red",
-                    )
-                ]
-            )
-        except Exception:
-            # fallback 成折線圖
-            fig = go.Figure()
-            fig.add_trace(
-                go.Scatter(
-                    x=hist.index,
-                    y=hist["Close"],
-                    mode="lines",
-                    name="收盤價",
-                    line=dict(color="#0050b3", width=2),
-                )
-            )
-
-        if show_ma and ma_df is not None:
-            if ma_df["MA5"].notna().any():
-                fig.add_trace(
-                    go.Scatter(
-                        x=ma_df.index,
-                        y=ma_df["MA5"],
-                        mode="lines",
-                        name="MA5",
-                        line=dict(color="#ffa500", width=1.5),
-                        yaxis="y",
-                    )
-                )
-            if ma_df["MA10"].notna().any():
-                fig.add_trace(
-                    go.Scatter(
-                        x=ma_df.index,
-                        y=ma_df["MA10"],
-                        mode="lines",
-                        name="MA10",
-                        line=dict(color="#2ca02c", width=1.3),
-                        yaxis="y",
-                    )
-                )
-            if ma_df["MA20"].notna().any():
-                fig.add_trace(
-                    go.Scatter(
-                        x=ma_df.index,
-                        y=ma_df["MA20"],
-                        mode="lines",
-                        name="MA20",
-                        line=dict(color="#9467bd", width=1.3),
-                        yaxis="y",
-                    )
-                )
-
-    fig.update_layout(
-        height=560,
-        xaxis_rangeslider_visible=False,
-        template="plotly_white",
-        # 強制 Plotly 圖表背景為白色，避免繼承深色主題
-        paper_bgcolor="white",
-        plot_bgcolor="white",
-        font=dict(color="black")
-    )
-
-    fig_json = fig.to_json()
-
-    html_code = f"""
-<div id="plot" style="width: 100%; height: 560px;"></div>
-<div style="margin-top: 8px;">
-  <button id="undoBtn">↩ Undo</button>
-  <button id="redoBtn">↪ Redo</button>
-  <button id="clearBtn">🧹 Clear</button>
-</div>
-
-<script src="https://cdn.plot.ly/plotly-2.32.0.min.js"></script>
-<script>
-  const fig = {fig_json};
-  const gd = document.getElementById('plot');
-
-  const config = {{
-    editable: true,
-    displaylogo: false,
-    modeBarButtonsToAdd: [
-      {{
-        name: '黑線',
-        icon: Plotly.Icons.pencil,
-        click: function(gd) {{
-          Plotly.relayout(gd, {{
-            'newshape.line.color': 'black',
-            'newshape.line.width': 2
-          }});
-        }}
-      }},
-      {{
-        name: '紅線',
-        icon: Plotly.Icons.pencil,
-        click: function(gd) {{
-          Plotly.relayout(gd, {{
-            'newshape.line.color': 'red',
-            'newshape.line.width': 2
-          }});
-        }}
-      }},
-      {{
-        name: '藍線',
-        icon: Plotly.Icons.pencil,
-        click: function(gd) {{
-          Plotly.relayout(gd, {{
-            'newshape.line.color': 'blue',
-            'newshape.line.width': 2
-          }});
-        }}
-      }},
-      {{
-        name: '綠線',
-        icon: Plotly.Icons.pencil,
-        click: function(gd) {{
-          Plotly.relayout(gd, {{
-            'newshape.line.color': 'green',
-            'newshape.line.width': 2
-          }});
-        }}
-      }},
-      'drawline',
-      'drawopenpath',
-      'eraseshape'
-    ]
-  }};
-
-  Plotly.newPlot(gd, fig.data, fig.layout, config);
-
-  // ====== 多步 Undo / Redo / Clear ======
-  let shapesHistory = [];
-  let currentIndex = -1;
-
-  function getCurrentShapes() {{
-    return gd.layout.shapes || [];
-  }}
-
-  function applyShapesFromHistory() {{
-    if (currentIndex >= 0 && currentIndex < shapesHistory.length) {{
-      const shapes = JSON.parse(shapesHistory[currentIndex]);
-      Plotly.relayout(gd, {{shapes: shapes}});
-    }}
-  }}
-
-  function saveState() {{
-    const shapes = getCurrentShapes();
-    const s = JSON.stringify(shapes);
-    if (shapesHistory.length === 0 || shapesHistory[shapesHistory.length - 1] !== s) {{
-      if (currentIndex < shapesHistory.length - 1) {{
-        shapesHistory = shapesHistory.slice(0, currentIndex + 1);
-      }}
-      shapesHistory.push(s);
-      currentIndex = shapesHistory.length - 1;
-    }}
-  }}
-
-  // 初始狀態
-  saveState();
-
-  gd.on('plotly_relayout', function(ev) {{
-    const keys = Object.keys(ev);
-    const touchedShape = keys.some(k => k === 'shapes' || k.startsWith('shapes['));
-    if (touchedShape) {{
-      saveState();
-    }}
-  }});
-
-  document.getElementById('undoBtn').onclick = function() {{
-    if (currentIndex > 0) {{
-      currentIndex -= 1;
-      applyShapesFromHistory();
-    }}
-  }};
-
-  document.getElementById('redoBtn').onclick = function() {{
-    if (currentIndex < shapesHistory.length - 1) {{
-      currentIndex += 1;
-      applyShapesFromHistory();
-    }}
-  }};
-
-  document.getElementById('clearBtn').onclick = function() {{
-    saveState();
-    Plotly.relayout(gd, {{shapes: []}});
-    saveState();
-  }};
-</script>
-"""
-    components.html(html_code, height=620)
-
-    # 額外技術指標（RSI + Volume）
-    with st.expander("📊 額外技術指標（RSI / 成交量）", expanded=False):
-        if "Close" in hist.columns:
-            close = hist["Close"].dropna()
-            if len(close) > 15:
-                delta = close.diff()
-                gain = delta.clip(lower=0).rolling(14).mean()
-                loss = (-delta.clip(upper=0)).rolling(14).mean()
-                rs = gain / loss
-                rsi = 100 - (100 / (1 + rs))
-                rsi_df = pd.DataFrame({"RSI(14)": rsi})
-                st.line_chart(rsi_df)
-            else:
-                st.caption("RSI 資料不足（至少需要 15 根 K）。")
-        if "Volume" in hist.columns:
-            vol_df = hist[["Volume"]].rename(columns={"Volume": "成交量"})
-            st.bar_chart(vol_df)
-
-
-# ========= 主程式 =========
-def main():
-    st.title("📈 美股智慧 AI 分析（Google Gemini）")
-    st.caption("輸入股票代號（例如：AAPL、TSLA、NVDA）")
-
-    # 側邊欄：選 Gemini 模型
-    with st.sidebar:
-        st.header("⚙️ AI 模型設定")
-        model_label = st.selectbox(
-            "選擇 Gemini 模型（影響分析深度與速度）",
-            list(MODEL_OPTIONS.keys()),
-            index=0,
-        )
-        selected_model = MODEL_OPTIONS[model_label]
-        st.markdown(
-            """
-            - ⚡ Flash：回應快、成本低  
-            - 🧠 1.5 Pro：推理更強、解釋更詳細  
-            """
-        )
-
-    col_input, col_period = st.columns([3, 1])
-    with col_input:
-        symbol = st.text_input(
-            "股票代號（Ticker）",
-            value=st.session_state["last_symbol"] or "AAPL",
-        )
-    with col_period:
-        period = st.selectbox(
-            "資料區間",
-            ["3mo", "6mo", "1y"],
-            index=["3mo", "6mo", "1y"].index(st.session_state["last_period"]),
-        )
-
-    analyze_clicked = st.button("開始分析", type="primary")
-
-    if analyze_clicked:
-        clean_symbol = symbol.strip().upper()
-        if clean_symbol:
-            st.session_state["analyzed"] = True
-            st.session_state["last_symbol"] = clean_symbol
-            st.session_state["last_period"] = period
-
-    if st.session_state["analyzed"] and st.session_state["last_symbol"]:
-        clean_symbol = st.session_state["last_symbol"]
-        period = st.session_state["last_period"]
-
-        try:
-            with st.spinner(f"正在載入 {clean_symbol} 資料…"):
-                data = fetch_us_stock(clean_symbol, period)
-                hist = data["price_history"]
-                indicators = compute_indicators(hist, data["fundamentals_raw"])
-                financials = fetch_financial_statements(clean_symbol)
-                earnings = fetch_earnings_summary(clean_symbol)
-
-            basic = data["basic_info"]
-            display_name = (
-                basic.get("longName")
-                or basic.get("shortName")
-                or clean_symbol
-            )
-
-            left, right = st.columns([2.2, 1.8])
-
-            # 左邊：即時價 + MA + 基本資料 + 圖 + 指標 + 財報表
-            with left:
-                # 即時價區
-                st.markdown('<div class="ai-card">', unsafe_allow_html=True)
-                st.markdown('<div class="ai-card-title">⏱ 近一小時 / 最近收盤價</div>', unsafe_allow_html=True)
-                rt = fetch_last_1h_price(clean_symbol)
-                if rt is not None:
-                    c1, c2 = st.columns(2)
-                    label_price = (
-                        "最新價（近一小時）" if rt["source"] == "intraday" else "最近收盤價"
-                    )
-                    with c1:
-                        st.metric(
-                            label_price,
-                            f"{rt['last']:.2f}",
-                            f"{rt['change']:+.2f}",
-                        )
-                    with c2:
-                        st.metric(
-                            "相對變化",
-                            f"{rt['pct'] * 100:+.2f} %",
-                        )
-                else:
-                    st.info("目前無法取得近一小時或收盤價（資料來源限制）。")
-                st.markdown("</div>", unsafe_allow_html=True)
-
-                # 最近一個交易日 MA / Volume
-                st.markdown('<div class="ai-card">', unsafe_allow_html=True)
-                st.markdown('<div class="ai-card-title">📆 最近一個交易日：均線 / 成交量</div>', unsafe_allow_html=True)
-                ma_info = fetch_last_daily_ma_volume(clean_symbol)
-                if ma_info is not None:
-                    ma_table = pd.DataFrame(
-                        {
-                            "項目": ["日期", "MA5", "MA10", "MA20", "成交量"],
-                            "數值": [
-                                ma_info["date"],
-                                f"{ma_info['ma5']:.2f}" if ma_info["ma5"] is not None else "N/A",
-                                f"{ma_info['ma10']:.2f}" if ma_info["ma10"] is not None else "N/A",
-                                f"{ma_info['ma20']:.2f}" if ma_info["ma20"] is not None else "N/A",
-                                f"{ma_info['volume']:.0f}" if ma_info["volume"] is not None else "N/A",
-                            ],
-                        }
-                    )
-                    st.table(ma_table)
-                else:
-                    st.info("無法取得最近交易日的均線與成交量資訊。")
-                st.markdown("</div>", unsafe_allow_html=True)
-
-                st.markdown('<div class="ai-card">', unsafe_allow_html=True)
-                st.markdown('<div class="ai-card-title">📌 基本資訊</div>', unsafe_allow_html=True)
-                st.write(f"**{display_name} ({clean_symbol})**")
-                st.write(
-                    f"{basic.get('sector')} / {basic.get('industry')} | "
-                    f"{basic.get('country')} | 貨幣：{basic.get('currency')}"
-                )
-                st.markdown("</div>", unsafe_allow_html=True)
-
-                st.markdown('<div class="ai-card">', unsafe_allow_html=True)
-                render_pro_chart(hist, period)
-                st.markdown("</div>", unsafe_allow_html=True)
-
-                st.markdown('<div class="ai-card">', unsafe_allow_html=True)
-                st.markdown('<div class="ai-card-title">📊 指標摘要</div>', unsafe_allow_html=True)
-                val = indicators["valuation"]
-                mom = indicators["momentum"]
-
-                def pct(x):
-                    return f"{x*100:.2f}%" if x is not None else "N/A"
-
-                table = pd.DataFrame(
-                    {
-                        "指標": [
-                            "現價",
-                            "本益比 (Trailing PE)",
-                            "預估本益比 (Forward PE)",
-                            "股價淨值比 (P/B)",
-                            "1M 報酬率",
-                            "3M 報酬率",
-                            "3M 波動度",
-                            "3M 高點",
-                            "3M 低點",
-                        ],
-                        "數值": [
-                            val.get("latestPrice"),
-                            val.get("trailingPE"),
-                            val.get("forwardPE"),
-                            val.get("priceToBook"),
-                            pct(mom.get("oneMonthReturn")),
-                            pct(mom.get("threeMonthReturn")),
-                            pct(mom.get("volatility3m")),
-                            mom.get("high3m"),
-                            mom.get("low3m"),
-                        ],
-                    }
-                )
-                st.table(table)
-                st.markdown("</div>", unsafe_allow_html=True)
-
-                st.markdown('<div class="ai-card">', unsafe_allow_html=True)
-                st.markdown('<div class="ai-card-title">📑 最近四季損益表</div>', unsafe_allow_html=True)
-                if (
-                    financials
-                    and "income_q" in financials
-                    and financials["income_q"] is not None
-                    and not financials["income_q"].empty
-                ):
-                    income_q = financials["income_q"]
-                    st.dataframe(income_q)
-
-                    cols = income_q.columns
-                    rev_col = next((c for c in cols if "Total Revenue" in str(c)), None)
-                    net_col = next((c for c in cols if "Net Income" in str(c)), None)
-
-                    if rev_col and net_col:
-                        mini = income_q[["period", rev_col, net_col]].copy()
-                        mini = mini.sort_values("period")
-                        mini.rename(
-                            columns={
-                                rev_col: "Revenue",
-                                net_col: "NetIncome",
-                            },
-                            inplace=True,
-                        )
-                        st.caption("最近幾季營收 / 淨利概況（由舊到新）：")
-                        st.table(mini.tail(4))
-
-                        with st.expander("📈 營收 / 淨利簡易趨勢圖"):
-                            chart_df = mini.set_index("period").tail(8)
-                            st.line_chart(chart_df)
-                    else:
-                        st.caption("（此股票損益資料欄位格式較特殊，暫無法自動整理趨勢圖。）")
-                else:
-                    st.info("找不到損益資料")
-                st.markdown("</div>", unsafe_allow_html=True)
-
-            # 右邊：AI 分析
-            with right:
-                st.markdown('<div class="ai-card">', unsafe_allow_html=True)
-                st.markdown('<div class="ai-card-title">🤖 AI 數據分析</div>', unsafe_allow_html=True)
-
-                main_question = (
-                    f"請針對目前取得的股價與基本面數據，"
-                    f"特別聚焦在顯示的時間區間「{period}」做一份完整分析。"
-                    "說明該期間內股價走勢、估值位置（例如本益比在產業中的相對高低）、"
-                    "以及此期間可以觀察到的亮點與潛在風險。"
-                )
-                summary = generate_analysis(
-                    symbol=clean_symbol,
-                    indicators=indicators,
-                    price_history=hist,
-                    user_question=main_question,
-                    model=selected_model,
-                )
-                st.markdown(summary)
-                st.markdown("</div>", unsafe_allow_html=True)
-
-                st.markdown('<div class="ai-card">', unsafe_allow_html=True)
-                st.markdown('<div class="ai-card-title">📊 財報亮點 / 風險 / 展望</div>', unsafe_allow_html=True)
-                try:
-                    insight = extract_earnings_insights(
-                        symbol=clean_symbol,
-                        earnings_data=earnings,
-                        financials=financials,
-                        model=selected_model,
-                    )
-                    if insight is None or not str(insight).strip():
-                        st.info(
-                            "目前找不到足夠的財報數據可以分析，因此暫時無法生成財報亮點。"
-                        )
-                    else:
-                        st.markdown(insight)
-                except Exception as e:
-                    st.error(f"財報分析時發生錯誤：{e}")
-                st.markdown("</div>", unsafe_allow_html=True)
-
-                st.markdown('<div class="ai-card">', unsafe_allow_html=True)
-                st.markdown('<div class="ai-card-title">🔍 追問 AI（可針對特定季度或期間）</div>', unsafe_allow_html=True)
-                q = st.text_input(
-                    "想問什麼？（例：請分析 2025 年第一季的表現、這一年股價波動與估值是否合理…）"
-                )
-                if st.button("送出追問"):
-                    review = review_question(
-                        question=q,
-                        symbol=clean_symbol,
-                        price_history=hist,
-                        financials=financials,
-                    )
-
-                    if review["level"] == "reject":
-                        st.error(review["message"])
-                    else:
-                        if review["level"] == "warn" and review["message"]:
-                            st.warning(review["message"])
-
-                        follow_up_question = (
-                            f"目前圖上顯示的時間區間為「{period}」。"
-                            f"請在這段期間的背景下，結合先前提供的數據，"
-                            f"回答以下追問，並盡量以該時間範圍內的變化為主：\n\n{q}"
-                        )
-                        ans = generate_analysis(
-                            symbol=clean_symbol,
-                            indicators=indicators,
-                            price_history=hist,
-                            user_question=follow_up_question,
-                            model=selected_model,
-                            guard_hint=review.get("system_hint", ""),
-                        )
-                        st.markdown("#### AI 回覆")
-                        st.markdown(ans)
-                st.markdown("</div>", unsafe_allow_html=True)
-
-            # 最下方：文字檔摘要 / 翻譯
-            st.markdown("---")
-            with st.expander("📄 文字檔摘要 / 翻譯（新聞、財報、法說會逐字稿｜支援 txt / md / pdf）"):
-                st.caption(
-                    "上傳與此公司相關的文字檔（PDF / TXT / MD），例如新聞、財報說明、法說會逐字稿等。"
-                )
-
-                uploaded = st.file_uploader(
-                    "上傳文字檔（txt / md / pdf）",
-                    type=["txt", "md", "pdf"],
-                )
-                manual = st.text_area("或直接貼上內容")
-
-                text = ""
-
-                if uploaded is not None:
-                    if uploaded.type == "application/pdf":
-                        try:
-                            import pdfplumber
-
-                            with pdfplumber.open(uploaded) as pdf:
-                                pages = [page.extract_text() or "" for page in pdf.pages]
-                                text = "\n".join(pages)
-                        except Exception as e:
-                            st.error(f"PDF 解析失敗：{e}")
-                            text = ""
-                    else:
-                        text = uploaded.read().decode("utf-8", "ignore")
-
-                elif manual.strip():
-                    text = manual.strip()
-
-                if text:
-                    if st.button("開始分析文字檔"):
-                        lower_text = text.lower()
-                        keywords = set()
-                        keywords.add(clean_symbol.lower())
-
-                        dn = display_name.lower()
-                        keywords.add(dn)
-                        for tok in dn.replace(",", " ").split():
-                            tok = tok.strip()
-                            if len(tok) > 2:
-                                keywords.add(tok)
-
-                        matched = any(k in lower_text for k in keywords)
-
-                        if not matched:
-                            st.error(
-                                f"這份文字檔看起來不像是關於 {display_name} ({clean_symbol}) 的內容，"
-                                "請確認是否上傳錯誤公司。"
-                            )
-                        else:
-                            with st.spinner("AI 正在進行翻譯與摘要…"):
-                                paragraphs = translate_transcript_paragraphs(
-                                    text, model=selected_model
-                                )
-                                transcript_summary = analyze_earnings_transcript(
-                                    clean_symbol, text, model=selected_model
-                                )
-
-                            st.subheader("逐段翻譯")
-                            for en, zh in paragraphs:
-                                c1, c2 = st.columns(2)
-                                with c1:
-                                    st.markdown(en)
-                                with c2:
-                                    st.markdown(zh)
-
-                            st.subheader("文字重點摘要 / 分析")
-                            st.markdown(transcript_summary)
-
-        except Exception as e:
-            st.error(f"發生錯誤：{e}")
-    else:
-        st.info("請先輸入股票代號並按下「開始分析」。")
-
-
-if __name__ == "__main__":
-    main()
+from __future__ import annotations
+import base64
+import functools
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+import numpy as np
+import pandas as pd
+
+# 假設這些模組您本地都有，請保持不動
+from core.data_fetch import (
+    fetch_us_stock,
+    fetch_earnings_summary,
+    fetch_financial_statements,
+)
+from core.indicators import compute_indicators
+from core._jit_indicators import _triple_ma, _wilder_rsi
+
+# 注意：yfinance / plotly / Gemini SDK 都改成用到才 import（延後載入），
+# 冷啟動不用先付 1~2 秒的模組載入成本
+
+
+# ========= Google Gemini 模型選項 =========
+MODEL_OPTIONS = {
+    "⚡ Gemini 2.0 Flash（快速）": "gemini-2.0-flash",
+    "🧠 Gemini 1.5 Pro（深度推理）": "gemini-1.5-pro",
+}
+
+st.set_page_config(page_title="美股 AI 分析工具（Gemini 版）", layout="wide")
+
+
+# ========= 全域 UI 美化 (V4 終極修復版：強制白底黑字輸入框) =========
+# CSS 是不變的字串，放在模組層級當常數，
+# 每次 rerun 才不用重新組字串、重送一次給瀏覽器
+_GLOBAL_CSS = """
+        <style>
+        /* 1. 全域設定：強制主畫面亮色背景，文字深色 */
+        .stApp {
+            background-color: #f5f7fb;
+            color: #333333 !important;
+        }
+        .main {
+            background-color: #f5f7fb;
+        }
+
+        /* 2. 標題強制深色 */
+        h1, h2, h3 {
+            font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", sans-serif;
+            color: #0f172a !important; 
+        }
+        h1 { font-weight: 700; }
+
+        /* 3. 卡片樣式 */
+        .ai-card {
+            padding: 1.1rem 1.2rem;
+            border-radius: 0.9rem;
+            background: #ffffff;
+            box-shadow: 0 6px 18px rgba(15, 23, 42, 0.08);
+            margin-bottom: 1.2rem;
+            color: #333333 !important;
+        }
+        .ai-card-title {
+            font-weight: 600;
+            font-size: 1.05rem;
+            margin-bottom: 0.6rem;
+            color: #0f172a !important;
+        }
+
+        /* 4. Expander (摺疊區) */
+        .streamlit-expanderHeader {
+            font-weight: 600;
+            color: #333333 !important;
+        }
+        .streamlit-expander {
+            border-radius: 0.75rem !important;
+            box-shadow: 0 6px 18px rgba(15, 23, 42, 0.06);
+            border: 1px solid #e2e8f0;
+            color: #333333 !important;
+            background-color: #ffffff !important;
+        }
+        .streamlit-expanderContent {
+            color: #333333 !important;
+        }
+
+        /* 5. 側邊欄：深色背景，文字淺色 */
+        section[data-testid="stSidebar"] {
+            background-color: #0f172a;
+        }
+        /* 側邊欄的一般文字預設為淺色 */
+        section[data-testid="stSidebar"] h1,
+        section[data-testid="stSidebar"] h2,
+        section[data-testid="stSidebar"] h3,
+        section[data-testid="stSidebar"] label,
+        section[data-testid="stSidebar"] span,
+        section[data-testid="stSidebar"] p,
+        section[data-testid="stSidebar"] div.stMarkdown {
+            color: #e5e7eb !important;
+        }
+
+        /* ========== 6. 關鍵修復：所有輸入框強制「白底黑字」 ========== */
+        /* 無論在側邊欄還是主畫面，輸入框一律白底，這樣就不會被深色模式影響 */
+
+        /* 下拉選單 (Selectbox) 的外框 */
+        div[data-baseweb="select"] > div {
+            background-color: #ffffff !important;
+            border-color: #d1d5db !important;
+            color: #333333 !important;
+        }
+        
+        /* 文字輸入框 (TextInput) 的外框 */
+        div[data-baseweb="input"] > div {
+            background-color: #ffffff !important;
+            border-color: #d1d5db !important;
+            color: #333333 !important;
+        }
+
+        /* 輸入框內的文字顏色 (強制深黑) */
+        div[data-baseweb="select"] div,
+        div[data-baseweb="input"] input {
+            color: #333333 !important;
+            -webkit-text-fill-color: #333333 !important; /* 相容 Safari */
+            caret-color: #333333 !important; /* 游標顏色 */
+        }
+
+        /* 下拉選單的箭頭圖示 */
+        div[data-baseweb="select"] svg {
+            fill: #333333 !important;
+        }
+
+        /* 下拉選單彈出的選項清單 (Popover) */
+        div[data-baseweb="popover"] div {
+            background-color: #ffffff !important;
+            color: #333333 !important;
+        }
+        
+        /* 表格文字 */
+        div[data-testid="stTable"] {
+            color: #333333 !important;
+        }
+        </style>
+        """
+
+
+def inject_global_css():
+    # 每次 rerun 都要重新 emit：Streamlit 會把沒重繪的元素移除，
+    # 只注入一次的話下一次互動 <style> 就消失了。
+    # 省的是字串「建構」成本（_GLOBAL_CSS 常數），不是 emit 本身
+    st.markdown(_GLOBAL_CSS, unsafe_allow_html=True)
+
+
+inject_global_css()
+
+# ========= 初始化 Session State =========
+if "analyzed" not in st.session_state:
+    st.session_state["analyzed"] = False
+    st.session_state["last_symbol"] = ""
+    st.session_state["last_period"] = "3mo"
+
+
+# ========= yfinance 快取層（避免每次 rerun 重打 Yahoo） =========
+# Streamlit 每次互動（切換圖表、打字）都會整份重跑，
+# 這裡用 st.cache_data 把網路請求變成記憶體查表：
+# - 盤中價格 ttl 短（60 秒）
+# - 日線 / 財報資料變動慢，ttl 拉長
+@st.cache_resource(show_spinner=False)
+def _get_ticker(symbol: str):
+    """
+    同一檔股票整個 process 共用一個 yf.Ticker：
+    cookie/crumb 握手只做一次，不讓每個 helper 各自 bootstrap。
+    """
+    import yfinance as yf  # 延後載入
+
+    return yf.Ticker(symbol)
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _cached_fetch_us_stock(symbol: str, period: str):
+    return fetch_us_stock(symbol, period, ticker=_get_ticker(symbol))
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _cached_financials(symbol: str):
+    return fetch_financial_statements(symbol, ticker=_get_ticker(symbol))
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _cached_earnings(symbol: str):
+    return fetch_earnings_summary(symbol, ticker=_get_ticker(symbol))
+
+
+# ========= 一次抓齊同一檔股票的日線 + 盤中資料 =========
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_history(symbol: str, period: str, interval: str):
+    """通用的 history 快取：同一組 (symbol, period, interval) 60 秒內只打一次 Yahoo。"""
+    return _get_ticker(symbol).history(period=period, interval=interval)
+
+
+def _get_ticker_bundle(symbol: str):
+    """
+    抓齊日線（3mo/1d）與盤中（2h/1m），讓即時價卡片與均線卡片共用。
+    底層走 _cached_history，rerun 時兩份都是快取命中。
+    回傳 dict: {daily, intraday}
+    """
+    try:
+        daily = _cached_history(symbol, "3mo", "1d")
+    except Exception:
+        daily = None
+    try:
+        intraday = _cached_history(symbol, "2h", "1m")
+    except Exception:
+        intraday = None
+    return {"daily": daily, "intraday": intraday}
+
+
+# ========= 近一小時 or 最近收盤價 =========
+def fetch_last_1h_price(symbol: str, bundle: dict | None = None):
+    """
+    先嘗試抓近一小時 1 分鐘線；若抓不到，改回傳最近收盤價與前一日比較。
+    回傳 dict: {last, change, pct, source}
+        source = "intraday" 或 "last_close"
+    """
+    try:
+        if bundle is None:
+            bundle = _get_ticker_bundle(symbol)
+
+        # 1. 先試 intraday（可能有延遲）
+        # 直接在 numpy 陣列上取頭尾，省掉 tail()/.iloc 的 pandas 索引機制
+        df = bundle["intraday"]
+        if df is not None and not df.empty:
+            arr = df["Close"].to_numpy(dtype=np.float64)
+            n = arr.size
+            first = float(arr[max(0, n - 60)])  # 最後 60 根的第一根
+            last = float(arr[-1])
+            pct = (last - first) / first if first != 0 else 0.0
+
+            return {
+                "last": last,
+                "change": last - first,
+                "pct": pct,
+                "source": "intraday",
+            }
+
+        # 2. 若抓不到 1 分鐘線，就改用日線最近收盤
+        daily = bundle["daily"]
+        if daily is None or daily.empty:
+            return None
+        darr = daily["Close"].to_numpy(dtype=np.float64)
+        last_close = float(darr[-1])
+        if darr.size >= 2:
+            prev_close = float(darr[-2])
+        else:
+            prev_close = last_close
+        change = last_close - prev_close
+        pct = (last_close - prev_close) / prev_close if prev_close != 0 else 0.0
+
+        return {
+            "last": last_close,
+            "change": change,
+            "pct": pct,
+            "source": "last_close",
+        }
+    except Exception:
+        return None
+
+
+# ========= DataFrame 便宜指紋（給 st.cache_data 當 key） =========
+def _hist_fingerprint(df: pd.DataFrame):
+    """
+    DataFrame 雜湊（給 st.cache_data 當 key）：
+    用 pandas 內建的 hash_pandas_object（底層 xxhash、向量化）對
+    索引與收盤價各取一個 64-bit 摘要，整份資料任何一格變動都會換 key，
+    又遠快於 Streamlit 預設的深度 pickling。
+    """
+    try:
+        idx_h = int(pd.util.hash_pandas_object(df.index).sum())
+        col = df["Close"] if "Close" in df.columns else df.iloc[:, -1]
+        return (idx_h, int(pd.util.hash_pandas_object(col).sum()))
+    except Exception:
+        return (len(df),)
+
+
+# ========= 均線：整份日線只算一次，圖表與卡片共用 =========
+def _compute_ma_lines(hist: pd.DataFrame):
+    """
+    對整份日線算一次 MA5 / MA10 / MA20。
+    直接回傳 numpy 陣列的 dict（Plotly 的 trace 可以直接吃 ndarray），
+    不再包一層 DataFrame；資料不足時回 None。
+    """
+    if hist is None or hist.empty or "Close" not in hist.columns:
+        return None
+    close_arr = hist["Close"].to_numpy(dtype="float64")
+    # 一趟迴圈同時算三條，close 只掃一次
+    ma5, ma10, ma20 = _triple_ma(close_arr, 5, 10, 20)
+    return {"MA5": ma5, "MA10": ma10, "MA20": ma20}
+
+
+# ========= 最近一個交易日的 MA / Volume =========
+def compute_last_daily_ma_volume(hist_daily: pd.DataFrame, ma_lines: dict | None = None):
+    """
+    從已經抓回來的日線算最近一個交易日的 MA5 / MA10 / MA20 / 成交量，
+    不再額外打 Yahoo。
+    回傳 dict: {date, ma5, ma10, ma20, volume}
+    """
+    try:
+        df = hist_daily
+        if df is None or df.empty:
+            return None
+        last_row = df.iloc[-1]
+        close_np = (
+            df["Close"].to_numpy(dtype="float64") if ma_lines is None else None
+        )
+
+        def last_ma(window: int):
+            if len(df) < window:
+                return None
+            if ma_lines is not None:
+                return float(ma_lines[f"MA{window}"][-1])
+            # 沒有現成均線就只平均尾端 window 筆，不為了一個值算整條 rolling
+            return float(close_np[-window:].mean())
+
+        ma5 = last_ma(5)
+        ma10 = last_ma(10)
+        ma20 = last_ma(20)
+        volume = float(last_row["Volume"]) if "Volume" in last_row else None
+        date = last_row.name.strftime("%Y-%m-%d")
+
+        return {
+            "date": date,
+            "ma5": ma5,
+            "ma10": ma10,
+            "ma20": ma20,
+            "volume": volume,
+        }
+    except Exception:
+        return None
+
+
+# ========= 顯示用小表格（Markdown，免走 DataFrame + arrow 序列化） =========
+def _md_table(header: tuple[str, str], rows) -> str:
+    """把 (名稱, 值) 列表排成兩欄 Markdown 表格；值為 None 顯示 N/A。"""
+    lines = [f"| {header[0]} | {header[1]} |", "| --- | --- |"]
+    for k, v in rows:
+        lines.append(f"| {k} | {'N/A' if v is None else v} |")
+    return "\n".join(lines)
+
+
+# 兩張卡片表格的內容在同一檔股票下不會變，但追問輸入框每敲一個字
+# 都會 rerun 整份 script——把格式化結果記憶在純量參數上，
+# rerun 時直接拿現成字串
+@st.cache_data(show_spinner=False)
+def _ma_table_md(date, ma5, ma10, ma20, volume) -> str:
+    return _md_table(
+        ("項目", "數值"),
+        [
+            ("日期", date),
+            ("MA5", f"{ma5:.2f}" if ma5 is not None else None),
+            ("MA10", f"{ma10:.2f}" if ma10 is not None else None),
+            ("MA20", f"{ma20:.2f}" if ma20 is not None else None),
+            ("成交量", f"{volume:.0f}" if volume is not None else None),
+        ],
+    )
+
+
+@st.cache_data(show_spinner=False)
+def _indicator_table_md(val_t: tuple, mom_t: tuple) -> str:
+    def pct(x):
+        return f"{x*100:.2f}%" if x is not None else "N/A"
+
+    latest, tpe, fpe, pb = val_t
+    one_m, three_m, vol3m, high3m, low3m = mom_t
+    return _md_table(
+        ("指標", "數值"),
+        [
+            ("現價", latest),
+            ("本益比 (Trailing PE)", tpe),
+            ("預估本益比 (Forward PE)", fpe),
+            ("股價淨值比 (P/B)", pb),
+            ("1M 報酬率", pct(one_m)),
+            ("3M 報酬率", pct(three_m)),
+            ("3M 波動度", pct(vol3m)),
+            ("3M 高點", high3m),
+            ("3M 低點", low3m),
+        ],
+    )
+
+
+# ========= 長序列降採樣（LTTB / OHLC 分桶） =========
+_MAX_PLOT_POINTS = 2000
+
+
+def _lttb_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets：挑出視覺上最能代表原折線的 n_out 個點。
+    比等距抽樣更能保留尖點與轉折。回傳遞增的索引陣列。
+    """
+    n = y.size
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.arange(n, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1, dtype=np.int64)
+    idxs = np.empty(n_out, dtype=np.int64)
+    idxs[0] = 0
+    idxs[-1] = n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        lo = int(edges[i])
+        hi = int(edges[i + 1])
+        # 下一桶的平均點（最後一桶用終點）
+        nlo = hi
+        nhi = int(edges[i + 2]) if i + 2 <= n_out - 2 else n
+        if nhi > nlo:
+            avg_x = x[nlo:nhi].mean()
+            avg_y = y[nlo:nhi].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        # 在本桶中挑出與前一點、下一桶平均點構成最大三角形面積的點
+        area = np.abs(
+            (x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(area.argmax())
+        idxs[i + 1] = a
+
+    return idxs
+
+
+def _bucket_ohlc(df: pd.DataFrame, n_out: int) -> pd.DataFrame:
+    """
+    K 線分桶：每桶取 first open / max high / min low / last close，
+    視覺上與原圖等價，但 K 棒數量固定在 n_out 以內。
+    """
+    n = len(df)
+    if n <= n_out:
+        return df
+    bounds = np.linspace(0, n, n_out + 1, dtype=np.int64)
+    o = df["Open"].to_numpy(dtype=np.float64)
+    h = df["High"].to_numpy(dtype=np.float64)
+    low = df["Low"].to_numpy(dtype=np.float64)
+    c = df["Close"].to_numpy(dtype=np.float64)
+
+    rows = {"Open": [], "High": [], "Low": [], "Close": []}
+    idx = []
+    for i in range(n_out):
+        lo, hi = int(bounds[i]), int(bounds[i + 1])
+        if hi <= lo:
+            continue
+        rows["Open"].append(o[lo])
+        rows["High"].append(h[lo:hi].max())
+        rows["Low"].append(low[lo:hi].min())
+        rows["Close"].append(c[hi - 1])
+        idx.append(df.index[lo])
+    return pd.DataFrame(rows, index=pd.Index(idx))
+
+
+# ========= 圖表 JSON（快取：widget 切換時不重新序列化） =========
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: _hist_fingerprint})
+def _build_fig_json(period: str, chart_type: str, show_ma: bool, hist: pd.DataFrame, ma_lines: dict | None) -> str:
+    """
+    建立 Plotly 圖並序列化成 JSON。
+    fig.to_json() 對幾百根 K 是純 Python 的大工程，快取之後
+    切換 expander / 打字等 rerun 直接拿現成字串。
+    """
+    import plotly.graph_objects as go  # 延後載入
+
+    # 勾選關閉時完全不碰均線（不算、不降採樣、不疊圖）
+    if not show_ma:
+        ma_lines = None
+    elif ma_lines is None:
+        ma_lines = _compute_ma_lines(hist)
+
+    # 只送會畫到的欄位給瀏覽器（Dividends / Stock Splits 用不到）；
+    # 超過 _MAX_PLOT_POINTS 就降採樣：折線用 LTTB、K 線用 OHLC 分桶，
+    # JSON 大小與前端解析時間固定在上限以內
+    plot_cols = [c for c in ("Open", "High", "Low", "Close") if c in hist.columns]
+    plot_df = hist[plot_cols]
+    if len(plot_df) > _MAX_PLOT_POINTS:
+        is_candle = chart_type != "收盤價折線圖" and all(
+            c in plot_df.columns for c in ("Open", "High", "Low")
+        )
+        if is_candle:
+            plot_df = _bucket_ohlc(plot_df, _MAX_PLOT_POINTS)
+            # 分桶後索引已變，疊圖均線改以桶化後的收盤重算
+            ma_lines = _compute_ma_lines(plot_df) if ma_lines is not None else None
+        else:
+            keep = _lttb_indices(
+                plot_df["Close"].to_numpy(dtype=np.float64), _MAX_PLOT_POINTS
+            )
+            plot_df = plot_df.iloc[keep]
+            if ma_lines is not None:
+                ma_lines = {k: v[keep] for k, v in ma_lines.items()}
+
+    # ---------- 建立 Plotly 圖 ----------
+    if chart_type == "收盤價折線圖":
+        fig = go.Figure()
+        fig.add_trace(
+            go.Scattergl(
+                x=plot_df.index,
+                y=plot_df["Close"],
+                mode="lines",
+                name="收盤價",
+                line=dict(color="#0050b3", width=2),
+            )
+        )
+
+    else:
+        # K 線圖：不用 go.Candlestick（每根 K 一個 SVG shape，幾千根就卡），
+        # 改成批次畫法——漲跌各一條 go.Bar 畫實體、影線用一條 Scattergl
+        # 以 None 分段一次畫完，同色全部併成單一繪圖呼叫
+        try:
+            o = plot_df["Open"].to_numpy(dtype=np.float64)
+            h = plot_df["High"].to_numpy(dtype=np.float64)
+            l = plot_df["Low"].to_numpy(dtype=np.float64)
+            c = plot_df["Close"].to_numpy(dtype=np.float64)
+            up = c >= o
+            idx = plot_df.index
+
+            # 影線：每根 K 貢獻 (low, high, None) 三個點，串成一條折線
+            n = len(plot_df)
+            wick_x = np.repeat(idx.to_numpy(), 3)
+            wick_y = np.empty(n * 3)
+            wick_y[0::3] = l
+            wick_y[1::3] = h
+            wick_y[2::3] = np.nan  # Scattergl 把 NaN 視為斷點
+
+            fig = go.Figure()
+            fig.add_trace(
+                go.Scattergl(
+                    x=wick_x,
+                    y=wick_y,
+                    mode="lines",
+                    line=dict(color="#666666", width=1),
+                    hoverinfo="skip",
+                    showlegend=False,
+                )
+            )
+            fig.add_trace(
+                go.Bar(
+                    x=idx[up],
+                    base=o[up],
+                    y=(c - o)[up],
+                    marker_color="green",
+                    marker_line_width=0,
+                    name="K 線（漲）",
+                    showlegend=False,
+                )
+            )
+            fig.add_trace(
+                go.Bar(
+                    x=idx[~up],
+                    base=o[~up],
+                    y=(c - o)[~up],
+                    marker_color="red",
+                    marker_line_width=0,
+                    name="K 線（跌）",
+                    showlegend=False,
+                )
+            )
+            fig.update_layout(barmode="overlay", bargap=0.2)
+        except Exception:
+            # fallback 成折線圖
+            fig = go.Figure()
+            fig.add_trace(
+                go.Scattergl(
+                    x=plot_df.index,
+                    y=plot_df["Close"],
+                    mode="lines",
+                    name="收盤價",
+                    line=dict(color="#0050b3", width=2),
+                )
+            )
+
+    # MA 疊圖（折線圖與 K 線圖共用）：numpy 陣列直接給 Plotly，
+    # 用 np.isnan(...).all() 判斷整條是否為空
+    if show_ma and ma_lines is not None:
+        for name, color, width in (
+            ("MA5", "#ffa500", 1.5),
+            ("MA10", "#2ca02c", 1.3),
+            ("MA20", "#9467bd", 1.3),
+        ):
+            arr = ma_lines[name]
+            if not np.isnan(arr).all():
+                fig.add_trace(
+                    go.Scattergl(
+                        x=plot_df.index,
+                        y=arr,
+                        mode="lines",
+                        name=name,
+                        line=dict(color=color, width=width),
+                        yaxis="y",
+                    )
+                )
+
+    fig.update_layout(
+        height=560,
+        xaxis_rangeslider_visible=False,
+        template="plotly_white",
+        # 強制 Plotly 圖表背景為白色，避免繼承深色主題
+        paper_bgcolor="white",
+        plot_bgcolor="white",
+        font=dict(color="black")
+    )
+
+    # 數值陣列改用 Plotly 的 typed-array 格式（base64 二進位，
+    # plotly.js 3.x 原生支援，requirements 已釘 plotly>=6）：
+    # payload 約縮一半，前端也免去逐數字 JSON.parse，直接落地成 Float64Array
+    from plotly.utils import PlotlyJSONEncoder
+
+    payload = fig.to_plotly_json()
+    for trace in payload.get("data", []):
+        for key in ("y", "base"):
+            val = trace.get(key)
+            if isinstance(val, np.ndarray) and val.dtype.kind == "f":
+                a = np.ascontiguousarray(val, dtype=np.float64)
+                trace[key] = {
+                    "dtype": "float64",
+                    "bdata": base64.b64encode(a.tobytes()).decode("ascii"),
+                }
+    return json.dumps(payload, cls=PlotlyJSONEncoder)
+
+
+# ========= 本地 plotly.js（免去每次冷載入都打 CDN 抓 3MB） =========
+_PLOTLY_JS_PATH = os.path.join(os.path.dirname(__file__), "static", "plotly.min.js")
+
+
+@st.cache_resource(show_spinner=False)
+def _plotly_js_src() -> str:
+    """
+    把 plotly 套件內建的 plotly.min.js 寫一份到 static/，
+    讓圖表 iframe 從本站（同源、可被瀏覽器快取）載入，
+    不用跨域去 cdn.plot.ly 抓。寫不出來就退回 CDN。
+    """
+    try:
+        # /app/static/ 只有在 enableStaticServing 開著才會被服務，
+        # 否則本地路徑會 404、圖整張空白；關著就直接走 CDN
+        if not st.get_option("server.enableStaticServing"):
+            return "https://cdn.plot.ly/plotly-3.0.1.min.js"
+        if not os.path.exists(_PLOTLY_JS_PATH):
+            from plotly.offline import get_plotlyjs
+
+            os.makedirs(os.path.dirname(_PLOTLY_JS_PATH), exist_ok=True)
+            with open(_PLOTLY_JS_PATH, "w", encoding="utf-8") as f:
+                f.write(get_plotlyjs())
+        return "/app/static/plotly.min.js"
+    except Exception:
+        # fallback 也要 3.x：2.x 看不懂 bdata 編碼，圖會整張空白
+        return "https://cdn.plot.ly/plotly-3.0.1.min.js"
+
+
+# ========= LLM 回覆快取（rerun 不重打 Gemini，也省 API 費用） =========
+@st.cache_data(ttl=600, show_spinner=False, hash_funcs={pd.DataFrame: _hist_fingerprint})
+def _cached_generate_analysis(symbol, indicators, price_history, user_question, model, guard_hint=""):
+    from core.ai_analyzer import generate_analysis  # 延後載入 Gemini SDK
+
+    return generate_analysis(
+        symbol=symbol,
+        indicators=indicators,
+        price_history=price_history,
+        user_question=user_question,
+        model=model,
+        guard_hint=guard_hint,
+    )
+
+
+@st.cache_data(ttl=600, show_spinner=False, hash_funcs={pd.DataFrame: _hist_fingerprint})
+def _cached_earnings_insights(symbol, earnings_data, financials, model):
+    from core.ai_analyzer import extract_earnings_insights  # 延後載入 Gemini SDK
+
+    return extract_earnings_insights(
+        symbol=symbol,
+        earnings_data=earnings_data,
+        financials=financials,
+        model=model,
+    )
+
+
+# ========= 損益表迷你趨勢（快取：rerun 不重組 DataFrame） =========
+def _income_fingerprint(df: pd.DataFrame):
+    """損益表的便宜指紋（列數 + 首尾 period），給 st.cache_data 當 key。"""
+    try:
+        return (len(df), str(df["period"].iloc[0]), str(df["period"].iloc[-1]))
+    except Exception:
+        return (len(df),)
+
+
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: _income_fingerprint})
+def _income_col_names(income_q: pd.DataFrame) -> tuple:
+    """欄位名稱只 str() 一次就快取，rerun 不再逐欄轉字串。"""
+    return tuple(map(str, income_q.columns))
+
+
+@st.cache_data(show_spinner=False)
+def _income_col_map(col_names: tuple):
+    """
+    掃一次損益表欄位，對應出常用欄位的實際名稱。
+    結果被快取，之後的 rerun 不用再逐欄比對字串。
+    """
+    return {
+        canon: next((c for c in col_names if canon in c), None)
+        for canon in ("Total Revenue", "Net Income", "Gross Profit", "Operating Income")
+    }
+
+
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: _income_fingerprint})
+def _build_income_mini(symbol: str, income_q: pd.DataFrame, rev_col: str, net_col: str):
+    """
+    用 numpy argsort 一次組出「period / Revenue / NetIncome」迷你表，
+    取代 copy → sort_values → rename 一連串的中間 DataFrame。
+    """
+    periods = income_q["period"].to_numpy()
+    order = np.argsort(periods)
+    return pd.DataFrame(
+        {
+            "period": periods[order],
+            "Revenue": income_q[rev_col].to_numpy()[order],
+            "NetIncome": income_q[net_col].to_numpy()[order],
+        }
+    )
+
+
+# ========= 專業版圖表（K 線 + MA + 畫線工具 + RSI/Volume） =========
+def render_pro_chart(hist: pd.DataFrame, period: str, ma_lines: dict | None = None):
+    st.subheader(f"📉 股價走勢（{period}）")
+
+    if hist is None or hist.empty:
+        st.warning("⚠ 找不到股價資料。")
+        return
+
+    # 資料太少（連假 / 週末邊界）就直接畫內建折線，
+    # 不值得為不到 10 根 K 走 Plotly 序列化 + iframe 那一整套
+    if len(hist) < 10 and "Close" in hist.columns:
+        st.line_chart(hist["Close"])
+        return
+
+    required_cols = ["Open", "High", "Low", "Close"]
+    has_ohlc = all(col in hist.columns for col in required_cols)
+
+    if has_ohlc:
+        chart_type = st.radio(
+            "圖表類型",
+            ["收盤價折線圖", "K 線圖（蠟燭圖）"],
+            horizontal=True,
+        )
+    else:
+        st.info("⚠ 此股票缺少開高低收（OHLC）資料，無法顯示 K 線圖。")
+        chart_type = "收盤價折線圖"
+
+    # 是否顯示 MA 線
+    show_ma = st.checkbox("顯示 MA5 / MA10 / MA20", value=True)
+
+    fig_json = _build_fig_json(period, chart_type, show_ma, hist, ma_lines)
+    plotly_src = _plotly_js_src()
+
+    html_code = f"""
+<div id="plot" style="width: 100%; height: 560px;"></div>
+<div style="margin-top: 8px;">
+  <button id="undoBtn">↩ Undo</button>
+  <button id="redoBtn">↪ Redo</button>
+  <button id="clearBtn">🧹 Clear</button>
+</div>
+
+<script src="{plotly_src}"></script>
+<script>
+  const fig = {fig_json};
+  const gd = document.getElementById('plot');
+
+  const config = {{
+    editable: true,
+    displaylogo: false,
+    modeBarButtonsToAdd: [
+      {{
+        name: '黑線',
+        icon: Plotly.Icons.pencil,
+        click: function(gd) {{
+          Plotly.relayout(gd, {{
+            'newshape.line.color': 'black',
+            'newshape.line.width': 2
+          }});
+        }}
+      }},
+      {{
+        name: '紅線',
+        icon: Plotly.Icons.pencil,
+        click: function(gd) {{
+          Plotly.relayout(gd, {{
+            'newshape.line.color': 'red',
+            'newshape.line.width': 2
+          }});
+        }}
+      }},
+      {{
+        name: '藍線',
+        icon: Plotly.Icons.pencil,
+        click: function(gd) {{
+          Plotly.relayout(gd, {{
+            'newshape.line.color': 'blue',
+            'newshape.line.width': 2
+          }});
+        }}
+      }},
+      {{
+        name: '綠線',
+        icon: Plotly.Icons.pencil,
+        click: function(gd) {{
+          Plotly.relayout(gd, {{
+            'newshape.line.color': 'green',
+            'newshape.line.width': 2
+          }});
+        }}
+      }},
+      'drawline',
+      'drawopenpath',
+      'eraseshape'
+    ]
+  }};
+
+  Plotly.newPlot(gd, fig.data, fig.layout, config);
+
+  // ====== 多步 Undo / Redo / Clear ======
+  let shapesHistory = [];
+  let currentIndex = -1;
+  // 歷史上限：每筆都是整份 shapes 的快照，畫很多筆時記憶體是 O(N^2)，
+  // 砍到 50 步讓它有界（超過就丟最舊的）
+  const MAX_HISTORY = 50;
+
+  function getCurrentShapes() {{
+    return gd.layout.shapes || [];
+  }}
+
+  function applyShapesFromHistory() {{
+    if (currentIndex >= 0 && currentIndex < shapesHistory.length) {{
+      const shapes = JSON.parse(shapesHistory[currentIndex]);
+      Plotly.relayout(gd, {{shapes: shapes}});
+    }}
+  }}
+
+  function saveState() {{
+    const shapes = getCurrentShapes();
+    const s = JSON.stringify(shapes);
+    if (shapesHistory.length === 0 || shapesHistory[shapesHistory.length - 1] !== s) {{
+      if (currentIndex < shapesHistory.length - 1) {{
+        shapesHistory = shapesHistory.slice(0, currentIndex + 1);
+      }}
+      shapesHistory.push(s);
+      if (shapesHistory.length > MAX_HISTORY) {{
+        shapesHistory.shift();
+      }}
+      currentIndex = shapesHistory.length - 1;
+    }}
+  }}
+
+  // 拖曳縮放時每個 pixel 都會觸發 relayout，加 150ms 尾端 debounce，
+  // 一次邏輯編輯只進一筆歷史
+  let saveTimer = null;
+  function debouncedSave() {{
+    clearTimeout(saveTimer);
+    saveTimer = setTimeout(saveState, 150);
+  }}
+
+  // 初始狀態（立即存，不經過 debounce，確保有 baseline 可 undo 回去）
+  saveState();
+
+  gd.on('plotly_relayout', function(ev) {{
+    const keys = Object.keys(ev);
+    const touchedShape = keys.some(k => k === 'shapes' || k.startsWith('shapes['));
+    if (touchedShape) {{
+      debouncedSave();
+    }}
+  }});
+
+  document.getElementById('undoBtn').onclick = function() {{
+    if (currentIndex > 0) {{
+      currentIndex -= 1;
+      applyShapesFromHistory();
+    }}
+  }};
+
+  document.getElementById('redoBtn').onclick = function() {{
+    if (currentIndex < shapesHistory.length - 1) {{
+      currentIndex += 1;
+      applyShapesFromHistory();
+    }}
+  }};
+
+  document.getElementById('clearBtn').onclick = function() {{
+    saveState();
+    Plotly.relayout(gd, {{shapes: []}});
+    saveState();
+  }};
+</script>
+"""
+    import streamlit.components.v1 as components  # 延後載入
+
+    components.html(html_code, height=620)
+
+    # 額外技術指標（RSI + Volume）
+    with st.expander("📊 額外技術指標（RSI / 成交量）", expanded=False):
+        if "Close" in hist.columns:
+            close = hist["Close"].dropna()
+            if len(close) > 15:
+                # Wilder RSI：交給 JIT 核心（core/_jit_indicators）
+                rsi = pd.Series(
+                    _wilder_rsi(close.to_numpy(dtype="float64"), 14),
+                    index=close.index,
+                    name="RSI(14)",
+                )
+                # st.line_chart 直接吃 Series，不用再包一層 DataFrame
+                st.line_chart(rsi)
+            else:
+                st.caption("RSI 資料不足（至少需要 15 根 K）。")
+        if "Volume" in hist.columns:
+            st.bar_chart(hist["Volume"].rename("成交量"))
+
+
+# ========= 提問模板（模組層級常數，rerun 不重組字串） =========
+# 這兩個字串同時也是 LLM 快取的 key 的一部分，
+# 做成確定性的模板 + lru_cache 才能穩定命中快取
+_MAIN_QUESTION_TMPL = (
+    "請針對目前取得的股價與基本面數據，"
+    "特別聚焦在顯示的時間區間「{period}」做一份完整分析。"
+    "說明該期間內股價走勢、估值位置（例如本益比在產業中的相對高低）、"
+    "以及此期間可以觀察到的亮點與潛在風險。"
+)
+
+_FOLLOW_UP_TMPL = (
+    "目前圖上顯示的時間區間為「{period}」。"
+    "請在這段期間的背景下，結合先前提供的數據，"
+    "回答以下追問，並盡量以該時間範圍內的變化為主：\n\n{question}"
+)
+
+
+@functools.lru_cache(maxsize=8)
+def _build_main_question(period: str) -> str:
+    return _MAIN_QUESTION_TMPL.format(period=period)
+
+
+@functools.lru_cache(maxsize=32)
+def _build_follow_up_question(period: str, question: str) -> str:
+    return _FOLLOW_UP_TMPL.format(period=period, question=question)
+
+
+# ========= 主程式 =========
+def main():
+    st.title("📈 美股智慧 AI 分析（Google Gemini）")
+    st.caption("輸入股票代號（例如：AAPL、TSLA、NVDA）")
+
+    # 側邊欄：選 Gemini 模型
+    with st.sidebar:
+        st.header("⚙️ AI 模型設定")
+        model_label = st.selectbox(
+            "選擇 Gemini 模型（影響分析深度與速度）",
+            list(MODEL_OPTIONS.keys()),
+            index=0,
+        )
+        selected_model = MODEL_OPTIONS[model_label]
+        st.markdown(
+            """
+            - ⚡ Flash：回應快、成本低  
+            - 🧠 1.5 Pro：推理更強、解釋更詳細  
+            """
+        )
+
+    col_input, col_period = st.columns([3, 1])
+    with col_input:
+        symbol = st.text_input(
+            "股票代號（Ticker）",
+            value=st.session_state["last_symbol"] or "AAPL",
+        )
+    with col_period:
+        period = st.selectbox(
+            "資料區間",
+            ["3mo", "6mo", "1y"],
+            index=["3mo", "6mo", "1y"].index(st.session_state["last_period"]),
+        )
+
+    analyze_clicked = st.button("開始分析", type="primary")
+
+    if analyze_clicked:
+        clean_symbol = symbol.strip().upper()
+        if clean_symbol:
+            st.session_state["analyzed"] = True
+            st.session_state["last_symbol"] = clean_symbol
+            st.session_state["last_period"] = period
+
+    if st.session_state["analyzed"] and st.session_state["last_symbol"]:
+        clean_symbol = st.session_state["last_symbol"]
+        period = st.session_state["last_period"]
+
+        try:
+            with st.spinner(f"正在載入 {clean_symbol} 資料…"):
+                # 四個抓取彼此獨立、都是網路 I/O，丟進 thread pool 同時跑，
+                # 等待時間變成「最慢的一支」而不是全部加總
+                with ThreadPoolExecutor(max_workers=4) as ex:
+                    f_data = ex.submit(_cached_fetch_us_stock, clean_symbol, period)
+                    f_fin = ex.submit(_cached_financials, clean_symbol)
+                    f_earn = ex.submit(_cached_earnings, clean_symbol)
+                    f_bundle = ex.submit(_get_ticker_bundle, clean_symbol)
+
+                    data = f_data.result()
+                    hist = data["price_history"]
+                    indicators = compute_indicators(hist, data["fundamentals_raw"])
+                    financials = f_fin.result()
+                    earnings = f_earn.result()
+                    bundle = f_bundle.result()
+
+                # 均線只算一次，圖表與卡片共用
+                ma_lines = _compute_ma_lines(hist)
+
+            basic = data["basic_info"]
+            display_name = (
+                basic.get("longName")
+                or basic.get("shortName")
+                or clean_symbol
+            )
+
+            left, right = st.columns([2.2, 1.8])
+
+            # 左邊：即時價 + MA + 基本資料 + 圖 + 指標 + 財報表
+            with left:
+                # 即時價區
+                st.markdown('<div class="ai-card">', unsafe_allow_html=True)
+                st.markdown('<div class="ai-card-title">⏱ 近一小時 / 最近收盤價</div>', unsafe_allow_html=True)
+                rt = fetch_last_1h_price(clean_symbol, bundle)
+                if rt is not None:
+                    c1, c2 = st.columns(2)
+                    label_price = (
+                        "最新價（近一小時）" if rt["source"] == "intraday" else "最近收盤價"
+                    )
+                    with c1:
+                        st.metric(
+                            label_price,
+                            f"{rt['last']:.2f}",
+                            f"{rt['change']:+.2f}",
+                        )
+                    with c2:
+                        st.metric(
+                            "相對變化",
+                            f"{rt['pct'] * 100:+.2f} %",
+                        )
+                else:
+                    st.info("目前無法取得近一小時或收盤價（資料來源限制）。")
+                st.markdown("</div>", unsafe_allow_html=True)
+
+                # 最近一個交易日 MA / Volume
+                st.markdown('<div class="ai-card">', unsafe_allow_html=True)
+                st.markdown('<div class="ai-card-title">📆 最近一個交易日：均線 / 成交量</div>', unsafe_allow_html=True)
+                ma_info = compute_last_daily_ma_volume(hist, ma_lines)
+                if ma_info is not None:
+                    st.markdown(
+                        _ma_table_md(
+                            ma_info["date"],
+                            ma_info["ma5"],
+                            ma_info["ma10"],
+                            ma_info["ma20"],
+                            ma_info["volume"],
+                        )
+                    )
+                else:
+                    st.info("無法取得最近交易日的均線與成交量資訊。")
+                st.markdown("</div>", unsafe_allow_html=True)
+
+                st.markdown('<div class="ai-card">', unsafe_allow_html=True)
+                st.markdown('<div class="ai-card-title">📌 基本資訊</div>', unsafe_allow_html=True)
+                st.write(f"**{display_name} ({clean_symbol})**")
+                st.write(
+                    f"{basic.get('sector')} / {basic.get('industry')} | "
+                    f"{basic.get('country')} | 貨幣：{basic.get('currency')}"
+                )
+                st.markdown("</div>", unsafe_allow_html=True)
+
+                st.markdown('<div class="ai-card">', unsafe_allow_html=True)
+                render_pro_chart(hist, period, ma_lines)
+                st.markdown("</div>", unsafe_allow_html=True)
+
+                st.markdown('<div class="ai-card">', unsafe_allow_html=True)
+                st.markdown('<div class="ai-card-title">📊 指標摘要</div>', unsafe_allow_html=True)
+                val = indicators["valuation"]
+                mom = indicators["momentum"]
+
+                st.markdown(
+                    _indicator_table_md(
+                        (
+                            val.get("latestPrice"),
+                            val.get("trailingPE"),
+                            val.get("forwardPE"),
+                            val.get("priceToBook"),
+                        ),
+                        (
+                            mom.get("oneMonthReturn"),
+                            mom.get("threeMonthReturn"),
+                            mom.get("volatility3m"),
+                            mom.get("high3m"),
+                            mom.get("low3m"),
+                        ),
+                    )
+                )
+                st.markdown("</div>", unsafe_allow_html=True)
+
+                st.markdown('<div class="ai-card">', unsafe_allow_html=True)
+                st.markdown('<div class="ai-card-title">📑 最近四季損益表</div>', unsafe_allow_html=True)
+                if (
+                    financials
+                    and "income_q" in financials
+                    and financials["income_q"] is not None
+                    and not financials["income_q"].empty
+                ):
+                    income_q = financials["income_q"]
+                    st.dataframe(income_q)
+
+                    col_map = _income_col_map(_income_col_names(income_q))
+                    rev_col = col_map["Total Revenue"]
+                    net_col = col_map["Net Income"]
+
+                    if rev_col and net_col:
+                        mini = _build_income_mini(clean_symbol, income_q, rev_col, net_col)
+                        st.caption("最近幾季營收 / 淨利概況（由舊到新）：")
+                        st.table(mini.tail(4))
+
+                        with st.expander("📈 營收 / 淨利簡易趨勢圖"):
+                            chart_df = mini.set_index("period").tail(8)
+                            st.line_chart(chart_df)
+                    else:
+                        st.caption("（此股票損益資料欄位格式較特殊，暫無法自動整理趨勢圖。）")
+                else:
+                    st.info("找不到損益資料")
+                st.markdown("</div>", unsafe_allow_html=True)
+
+            # 右邊：AI 分析
+            with right:
+                st.markdown('<div class="ai-card">', unsafe_allow_html=True)
+                st.markdown('<div class="ai-card-title">🤖 AI 數據分析</div>', unsafe_allow_html=True)
+
+                main_question = _build_main_question(period)
+                summary = _cached_generate_analysis(
+                    clean_symbol,
+                    indicators,
+                    hist,
+                    main_question,
+                    selected_model,
+                )
+                st.markdown(summary)
+                st.markdown("</div>", unsafe_allow_html=True)
+
+                st.markdown('<div class="ai-card">', unsafe_allow_html=True)
+                st.markdown('<div class="ai-card-title">📊 財報亮點 / 風險 / 展望</div>', unsafe_allow_html=True)
+                try:
+                    insight = _cached_earnings_insights(
+                        clean_symbol,
+                        earnings,
+                        financials,
+                        selected_model,
+                    )
+                    if insight is None or not str(insight).strip():
+                        st.info(
+                            "目前找不到足夠的財報數據可以分析，因此暫時無法生成財報亮點。"
+                        )
+                    else:
+                        st.markdown(insight)
+                except Exception as e:
+                    st.error(f"財報分析時發生錯誤：{e}")
+                st.markdown("</div>", unsafe_allow_html=True)
+
+                st.markdown('<div class="ai-card">', unsafe_allow_html=True)
+                st.markdown('<div class="ai-card-title">🔍 追問 AI（可針對特定季度或期間）</div>', unsafe_allow_html=True)
+                q = st.text_input(
+                    "想問什麼？（例：請分析 2025 年第一季的表現、這一年股價波動與估值是否合理…）"
+                )
+                if st.button("送出追問"):
+                    from core.ai_analyzer import generate_analysis_stream, review_question
+
+                    review = review_question(
+                        question=q,
+                        symbol=clean_symbol,
+                        price_history=hist,
+                        financials=financials,
+                    )
+
+                    if review["level"] == "reject":
+                        st.error(review["message"])
+                    else:
+                        if review["level"] == "warn" and review["message"]:
+                            st.warning(review["message"])
+
+                        follow_up_question = _build_follow_up_question(period, q)
+                        st.markdown("#### AI 回覆")
+                        # 追問每次內容都不同、快取命中率低，
+                        # 改走串流：第一批 token 幾百毫秒就上畫面
+                        st.write_stream(
+                            generate_analysis_stream(
+                                symbol=clean_symbol,
+                                indicators=indicators,
+                                price_history=hist,
+                                user_question=follow_up_question,
+                                model=selected_model,
+                                guard_hint=review.get("system_hint", ""),
+                            )
+                        )
+                st.markdown("</div>", unsafe_allow_html=True)
+
+            # 最下方：文字檔摘要 / 翻譯
+            st.markdown("---")
+            with st.expander("📄 文字檔摘要 / 翻譯（新聞、財報、法說會逐字稿｜支援 txt / md / pdf）"):
+                st.caption(
+                    "上傳與此公司相關的文字檔（PDF / TXT / MD），例如新聞、財報說明、法說會逐字稿等。"
+                )
+
+                uploaded = st.file_uploader(
+                    "上傳文字檔（txt / md / pdf）",
+                    type=["txt", "md", "pdf"],
+                )
+                manual = st.text_area("或直接貼上內容")
+
+                # 以「頁」為單位保留文字：關鍵字檢查可以逐頁早退，
+                # 確認內容相關之後才把整份文字串成一個大字串給 LLM
+                text_parts: list[str] = []
+
+                if uploaded is not None:
+                    if uploaded.type == "application/pdf":
+                        # 優先用 pypdfium2（原生 PDFium，抽文字比純 Python 的
+                        # pdfplumber 快很多）；沒裝或解析失敗才退回 pdfplumber
+                        try:
+                            import pypdfium2 as pdfium
+
+                            pdf = pdfium.PdfDocument(uploaded.read())
+                            text_parts = [
+                                page.get_textpage().get_text_range() for page in pdf
+                            ]
+                        except Exception:
+                            try:
+                                import pdfplumber
+
+                                uploaded.seek(0)
+                                with pdfplumber.open(uploaded) as pdf:
+                                    text_parts = [
+                                        page.extract_text() or "" for page in pdf.pages
+                                    ]
+                            except Exception as e:
+                                st.error(f"PDF 解析失敗：{e}")
+                                text_parts = []
+                    else:
+                        text_parts = [uploaded.read().decode("utf-8", "ignore")]
+
+                elif manual.strip():
+                    text_parts = [manual.strip()]
+
+                if any(p for p in text_parts):
+                    if st.button("開始分析文字檔"):
+                        keywords = set()
+                        keywords.add(clean_symbol.lower())
+
+                        dn = display_name.lower()
+                        keywords.add(dn)
+                        for tok in dn.replace(",", " ").split():
+                            tok = tok.strip()
+                            if len(tok) > 2:
+                                keywords.add(tok)
+
+                        # 一支 alternation regex 掃一次全文就好；IGNORECASE
+                        # 也省掉 text.lower() 整份字串的複製
+                        pattern = re.compile(
+                            "|".join(re.escape(k) for k in keywords if k),
+                            re.IGNORECASE,
+                        )
+                        # 逐頁搜尋，找到第一個命中就停
+                        matched = any(pattern.search(part) for part in text_parts)
+
+                        if not matched:
+                            st.error(
+                                f"這份文字檔看起來不像是關於 {display_name} ({clean_symbol}) 的內容，"
+                                "請確認是否上傳錯誤公司。"
+                            )
+                        else:
+                            text = "\n".join(text_parts)
+                            with st.spinner("AI 正在進行翻譯與摘要…"):
+                                from core.ai_analyzer import (
+                                    translate_transcript_paragraphs,
+                                    analyze_earnings_transcript,
+                                )
+
+                                paragraphs = translate_transcript_paragraphs(
+                                    text, model=selected_model
+                                )
+                                transcript_summary = analyze_earnings_transcript(
+                                    clean_symbol, text, model=selected_model
+                                )
+
+                            st.subheader("逐段翻譯")
+                            for en, zh in paragraphs:
+                                c1, c2 = st.columns(2)
+                                with c1:
+                                    st.markdown(en)
+                                with c2:
+                                    st.markdown(zh)
+
+                            st.subheader("文字重點摘要 / 分析")
+                            st.markdown(transcript_summary)
+
+        except Exception as e:
+            st.error(f"發生錯誤：{e}")
+    else:
+        st.info("請先輸入股票代號並按下「開始分析」。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# core/_jit_indicators.py
+# -------------------------------------------------
+# MA / RSI 的逐根迴圈核心：
+# - 有裝 numba → @njit(cache=True) 編成原生迴圈，免去每根 K 的
+#   Python box/unbox 開銷；cache=True 讓第二次啟動不用重編
+# - 沒裝 numba → 退回純 Python 版（邏輯完全相同，只是慢）
+# -------------------------------------------------
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    # numba 是選配；沒有就用 no-op 裝飾器跑純 Python 版
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+
+        def wrapper(func):
+            return func
+
+        return wrapper
+
+
+@njit(cache=True)
+def _triple_ma(close, w1, w2, w3):
+    """
+    一趟同時算三條滑動平均（各自維護 running sum），
+    記憶體頻寬只掃 close 一次，而不是三次。
+    回傳 (ma1, ma2, ma3) 三個與 close 等長的陣列。
+    """
+    n = close.size
+    out1 = np.full(n, np.nan)
+    out2 = np.full(n, np.nan)
+    out3 = np.full(n, np.nan)
+    s1 = 0.0
+    s2 = 0.0
+    s3 = 0.0
+    for i in range(n):
+        v = close[i]
+        s1 += v
+        s2 += v
+        s3 += v
+        if i >= w1:
+            s1 -= close[i - w1]
+        if i >= w2:
+            s2 -= close[i - w2]
+        if i >= w3:
+            s3 -= close[i - w3]
+        if i >= w1 - 1:
+            out1[i] = s1 / w1
+        if i >= w2 - 1:
+            out2[i] = s2 / w2
+        if i >= w3 - 1:
+            out3[i] = s3 / w3
+    return out1, out2, out3
+
+
+@njit(cache=True)
+def _wilder_rsi(close, period):
+    """
+    Wilder RSI：前 period 根用簡單平均起始，之後用
+    avg = (avg * (period-1) + 當根漲跌) / period 遞迴。
+    回傳與 close 等長的陣列，前 period 格為 NaN。
+    """
+    n = close.size
+    out = np.full(n, np.nan)
+    if n <= period:
+        return out
+
+    avg_up = 0.0
+    avg_dn = 0.0
+    for i in range(1, period + 1):
+        d = close[i] - close[i - 1]
+        if d > 0:
+            avg_up += d
+        else:
+            avg_dn -= d
+    avg_up /= period
+    avg_dn /= period
+    if avg_dn == 0.0:
+        out[period] = 100.0
+    else:
+        out[period] = 100.0 - 100.0 / (1.0 + avg_up / avg_dn)
+
+    for i in range(period + 1, n):
+        d = close[i] - close[i - 1]
+        up = d if d > 0 else 0.0
+        dn = -d if d < 0 else 0.0
+        avg_up = (avg_up * (period - 1) + up) / period
+        avg_dn = (avg_dn * (period - 1) + dn) / period
+        if avg_dn == 0.0:
+            out[i] = 100.0
+        else:
+            out[i] = 100.0 - 100.0 / (1.0 + avg_up / avg_dn)
+
+    return out
+
+
+# 預熱：import 時先用小陣列觸發 JIT 編譯，
+# 第一個使用者請求就不用等數秒的編譯時間
+try:
+    _warm = np.arange(32, dtype=np.float64)
+    _triple_ma(_warm, 5, 10, 20)
+    _wilder_rsi(_warm, 14)
+except Exception:
+    pass
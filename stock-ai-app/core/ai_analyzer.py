@@ -1,537 +1,934 @@
-# core/ai_analyzer.py
-# -------------------------------------------------
-# 使用 Google Gemini 作為 LLM：
-# - 讀取環境變數 GOOGLE_API_KEY
-# - 有 key → 用 Gemini 回覆
-# - 沒 key 或出錯 → fallback 規則版
-# - 保留 Question Guard（review_question）
-# -------------------------------------------------
-
-from __future__ import annotations
-
-import os
-import re
-import json
-import textwrap
-from typing import Dict, Any, List, Tuple, Optional
-
-# =============== Google Gemini SDK ===============
-# pip install google-generativeai
-import google.generativeai as genai
-
-GOOGLE_API_KEY: Optional[str] = os.getenv("GOOGLE_API_KEY")
-
-if GOOGLE_API_KEY:
-    genai.configure(api_key=GOOGLE_API_KEY)
-
-
-# ================= 工具：清理文字 =================
-def clean_text(text: str) -> str:
-    if not text:
-        return ""
-    text = text.replace("\r", " ").replace("\n", " ")
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
-
-
-# =========== 內部：呼叫 Gemini 模型 ===========
-def _call_llm(model: str, system_prompt: str, user_prompt: str) -> str:
-    """
-    共用 LLM 呼叫：
-    - model: "gemini-2.0-flash" 或 "gemini-1.5-pro"
-    - system_prompt: 系統角色
-    - user_prompt: 使用者問題 + 數據
-    """
-    if not GOOGLE_API_KEY:
-        raise RuntimeError("GOOGLE_API_KEY not found")
-
-    gm = genai.GenerativeModel(model)
-
-    # Gemini 不區分 system/user，我們直接組一個完整 prompt
-    prompt = system_prompt.strip() + "\n\n=== 使用者輸入 ===\n" + user_prompt.strip()
-
-    resp = gm.generate_content(prompt)
-    # resp.text 是整段生成內容
-    return (resp.text or "").strip()
-
-
-# ========= 規則版分析（fallback 用） =========
-def _rule_based_stock_analysis(
-    symbol: str,
-    indicators: dict,
-    user_question: str | None,
-) -> str:
-    val = indicators.get("valuation", {})
-    mom = indicators.get("momentum", {})
-
-    latest_price = val.get("latestPrice")
-    pe = val.get("trailingPE")
-    fpe = val.get("forwardPE")
-
-    one_m = mom.get("oneMonthReturn")
-    three_m = mom.get("threeMonthReturn")
-
-    def fmt_pct(x):
-        if x is None:
-            return "N/A"
-        return f"{x * 100:.2f}%"
-
-    trend = "-"
-    if isinstance(three_m, (int, float)):
-        if three_m > 0.05:
-            trend = "明顯上升"
-        elif three_m < -0.05:
-            trend = "明顯下跌"
-        else:
-            trend = "相對震盪整理"
-
-    question_part = f"\n\n你問的問題：「{user_question}」\n" if user_question else ""
-
-    txt = f"""
-    ## 📈 股票分析（規則版，未啟用 Gemini）
-
-    **股票：{symbol}**
-
-    ### 🔹 1. 基本估值
-    - 現價：{latest_price}
-    - 本益比（PE）：{pe}
-    - 預估本益比（Forward PE）：{fpe}
-
-    ### 🔹 2. 股價動能
-    - 1 個月報酬：{fmt_pct(one_m)}（短期情緒參考）
-    - 3 個月報酬：{fmt_pct(three_m)} → **{trend}**
-
-    ### 🔹 3. 亮點（根據簡單規則推斷）
-    - 3M 上漲視為多方氣氛較強。
-    - Forward PE 若低於 PE，代表市場對未來成長有期待。
-
-    ### 🔹 4. 風險
-    - 若 3M 報酬率為負，須注意可能的下跌趨勢。
-    - 若 PE 遠高於產業平均，可能有估值過高風險。
-
-    ### 🔹 5. 說明
-    ⚠ 目前尚未啟用 Google Gemini 模型，
-    因此本分析為「規則 + 模板」自動生成。
-
-    {question_part}
-    """
-    return textwrap.dedent(txt)
-
-
-def _rule_based_earnings(symbol: str) -> str:
-    txt = f"""
-    ## 📝 財報亮點摘要（規則版）
-
-    股票：{symbol}
-
-    ### 🔹 可能的亮點
-    - 最近季度營收高於前季，通常被視為正向訊號。
-    - 毛利率提升代表成本控制較佳。
-
-    ### 🔹 潛在風險
-    - 淨利較上季下滑時，需留意獲利穩定度。
-    - 若營業活動現金流連續下滑，可能埋有財務壓力。
-
-    ### 🔹 提醒
-    ⚠ 本段仍為規則運算，並非真正 LLM 解析逐字稿與財報。
-    """
-    return textwrap.dedent(txt)
-
-
-# =============== 問題審查器（Question Guard） ===============
-_FIN_KW_ZH = [
-    "營收",
-    "獲利",
-    "毛利",
-    "淨利",
-    "成長",
-    "估值",
-    "本益比",
-    "股價",
-    "股息",
-    "配息",
-    "現金流",
-    "財報",
-    "季度",
-    "展望",
-    "風險",
-]
-
-_FIN_KW_EN = [
-    "revenue",
-    "profit",
-    "margin",
-    "guidance",
-    "valuation",
-    "dividend",
-    "eps",
-    "cash flow",
-    "earnings",
-    "quarter",
-    "risk",
-    "growth",
-]
-
-_YEAR_RE = re.compile(r"(19|20)\d{2}")
-
-
-def review_question(
-    question: str,
-    symbol: str,
-    price_history=None,
-    financials=None,
-) -> Dict[str, Any]:
-    """
-    回傳：
-    {
-      "level": "ok" | "warn" | "reject",
-      "reason": "...",
-      "message": "要顯示給使用者看的文字",
-      "system_hint": "要塞進 system prompt 的補充說明（可為空字串）"
-    }
-    """
-    q = clean_text(question)
-    if not q:
-        return {
-            "level": "reject",
-            "reason": "empty",
-            "message": "❌ 問題內容是空的，請具體輸入想分析的重點或疑問。",
-            "system_hint": "",
-        }
-
-    # 1) 太短直接拒絕
-    if len(q) <= 3:
-        return {
-            "level": "reject",
-            "reason": "too_short",
-            "message": "❌ 問題太短了，請再具體一些（例如：想看哪一段期間、估值、財報或風險？）。",
-            "system_hint": "",
-        }
-
-    # 2) 明顯亂打（大量標點 / 符號）
-    alpha_num_zh = re.findall(r"[A-Za-z0-9\u4e00-\u9fff]", q)
-    if len(alpha_num_zh) / len(q) < 0.35:
-        return {
-            "level": "reject",
-            "reason": "gibberish",
-            "message": "❌ 這個問題看起來像是隨機字元或無法判讀的內容，請重新敘述你的問題。",
-            "system_hint": "",
-        }
-
-    # 3) 關鍵字檢查（沒有財經關鍵字 → warn 但允許）
-    has_fin_kw = any(kw in q for kw in _FIN_KW_ZH) or any(
-        kw in q.lower() for kw in _FIN_KW_EN
-    )
-
-    warn_msgs: List[str] = []
-    system_hints: List[str] = []
-
-    if not has_fin_kw:
-        warn_msgs.append(
-            "⚠ 這個問題沒有明顯的財經 / 股價 / 財報關鍵字，我會盡量從一般角度回答，"
-            "但也可能提醒你這個工具主要是用來做股票與財報分析。"
-        )
-        system_hints.append(
-            "若使用者提問與股票 / 財報 /金融無直接關聯，請先說明本工具主要用途，"
-            "再視情況簡要回答；若完全無關，建議禮貌回覆無法回答。"
-        )
-
-    # 4) 年份範圍檢查（從問題抓出年份）
-    years_in_q = [int(y) for y in _YEAR_RE.findall(q)] if _YEAR_RE.findall(q) else []
-
-    data_years: List[int] = []
-    if price_history is not None and hasattr(price_history, "index"):
-        try:
-            for idx in price_history.index:
-                y = getattr(idx, "year", None)
-                if y:
-                    data_years.append(int(y))
-        except Exception:
-            pass
-
-    if financials and isinstance(financials, dict):
-        inc = financials.get("income_q")
-        if inc is not None and not inc.empty and "period" in inc.columns:
-            for p in inc["period"]:
-                try:
-                    y = getattr(p, "year", None)
-                    if y:
-                        data_years.append(int(y))
-                except Exception:
-                    try:
-                        m = _YEAR_RE.search(str(p))
-                        if m:
-                            data_years.append(int(m.group()))
-                    except Exception:
-                        pass
-
-    if data_years and years_in_q:
-        min_y, max_y = min(data_years), max(data_years)
-        out_of_range = [y for y in years_in_q if y < min_y or y > max_y]
-        if out_of_range:
-            warn_msgs.append(
-                f"⚠ 問題中提到的年份 {sorted(set(out_of_range))} 超出目前資料範圍 "
-                f"（約 {min_y} ~ {max_y}），回答時會盡量以可取得的年份說明，並提醒這一點。"
-            )
-            system_hints.append(
-                "使用者問題涉及資料範圍以外的年份時，請先明確說明資料僅涵蓋的區間，"
-                "再依現有資料做推論；對於沒有資料的年份，不要虛構具體數字或事件。"
-            )
-
-    if not warn_msgs:
-        return {
-            "level": "ok",
-            "reason": "pass",
-            "message": "",
-            "system_hint": "",
-        }
-
-    return {
-        "level": "warn",
-        "reason": "warn",
-        "message": "\n\n".join(warn_msgs),
-        "system_hint": "\n".join(system_hints),
-    }
-
-
-# ============ Gemini 版：主分析（AI 數據分析） ============
-def generate_analysis(
-    symbol: str,
-    indicators: dict,
-    price_history,
-    user_question: str | None = None,
-    model: str | None = None,
-    guard_hint: str | None = None,
-) -> str:
-    """
-    若有 GOOGLE_API_KEY 且指定 model → 呼叫 Gemini
-    否則自動 fallback 規則版。
-    """
-    if (model is None) or (not GOOGLE_API_KEY):
-        return _rule_based_stock_analysis(symbol, indicators, user_question)
-
-    val = indicators.get("valuation", {})
-    mom = indicators.get("momentum", {})
-
-    def safe_float(x):
-        try:
-            return float(x)
-        except Exception:
-            return None
-
-    payload = {
-        "symbol": symbol,
-        "valuation": {
-            "latestPrice": safe_float(val.get("latestPrice")),
-            "trailingPE": safe_float(val.get("trailingPE")),
-            "forwardPE": safe_float(val.get("forwardPE")),
-            "priceToBook": safe_float(val.get("priceToBook")),
-        },
-        "momentum": {
-            "oneMonthReturn": safe_float(mom.get("oneMonthReturn")),
-            "threeMonthReturn": safe_float(mom.get("threeMonthReturn")),
-            "volatility3m": safe_float(mom.get("volatility3m")),
-            "high3m": safe_float(mom.get("high3m")),
-            "low3m": safe_float(mom.get("low3m")),
-        },
-    }
-
-    system_prompt = textwrap.dedent(
-        f"""
-        你是一位專門分析「美股」與「財報」的專業投資顧問，回答時請使用**繁體中文**，
-        風格清楚、有條理、但不要過度艱深。
-
-        核心原則：
-        1. 僅能根據使用者提供的指標資料與一般常識進行推理，不可捏造具體數字、年份或事件。
-        2. 若無法從資料中合理推論答案，要明確說「目前資料無法判斷」或「缺乏足夠資料」。
-        3. 若問題與股票 / 財報 / 投資風險無關，先說本工具的用途，再視情況簡要回答或婉拒。
-        4. 盡量給出「亮點」、「風險」、「需要關注的指標」三個層次的說明。
-        5. 若有額外的 guard 說明，必須一併遵守。
-
-        {guard_hint or ""}
-        """
-    )
-
-    user_prompt = textwrap.dedent(
-        f"""
-        以下是關於股票 {symbol} 的指標資料（JSON）：
-
-        {json.dumps(payload, ensure_ascii=False, indent=2, default=str)}
-
-        請根據這些資料，給出一份結構化的分析報告，格式包含：
-        1. 估值概況（本益比、股價淨值比等，大致是偏貴、偏便宜、還是合理區間）
-        2. 近期股價動能（1M / 3M 報酬率、波動度與高低點的解讀）
-        3. 亮點（列出 2–4 點）
-        4. 風險與需要特別留意的項目（列出 2–4 點）
-        5. 給一般投資人的提醒（不要當作投資建議）
-
-        使用者目前的提問是：
-        {user_question or "「沒有額外提問，只是想看這檔股票在目前區間的綜合分析。」"}
-        """
-    )
-
-    try:
-        return _call_llm(model=model, system_prompt=system_prompt, user_prompt=user_prompt)
-    except Exception:
-        return _rule_based_stock_analysis(symbol, indicators, user_question)
-
-
-# ============ Gemini 版：財報亮點 ============
-def extract_earnings_insights(
-    symbol: str,
-    earnings_data,
-    financials,
-    model: str | None = None,
-) -> str:
-    """
-    傳入 yfinance earnings / financials，請 LLM 幫忙整理財報亮點。
-    沒有模型或金鑰時就用規則版。
-    """
-    if (model is None) or (not GOOGLE_API_KEY):
-        return _rule_based_earnings(symbol)
-
-    income_q = None
-    if financials and isinstance(financials, dict):
-        income_q = financials.get("income_q")
-
-    income_json = None
-    if income_q is not None and not income_q.empty:
-        try:
-            income_json = income_q.head(4).to_dict(orient="records")
-        except Exception:
-            income_json = None
-
-    data_payload = {
-        "symbol": symbol,
-        "earnings_table": getattr(earnings_data, "to_dict", lambda **k: None)(
-            orient="index"
-        )
-        if hasattr(earnings_data, "to_dict")
-        else None,
-        "income_q": income_json,
-    }
-
-    system_prompt = textwrap.dedent(
-        """
-        你是一位專門閱讀美股財報與法說會資訊的分析師，回答以繁體中文。
-        目標是從有限的 earnings / 損益表資訊中，整理出：
-        1. 最近幾季的營收與獲利趨勢（成長或衰退、是否穩定）
-        2. 毛利率 / 營業利益率是否改善或惡化（若有資料）
-        3. 管理階層可能關注的重點與風險（根據數字合理推論）
-        4. 給一般投資人的提醒（不是投資建議）
-
-        若發現資料極少或欄位不足，請明確說明限制，不要胡亂猜測。
-        """
-    )
-
-    user_prompt = textwrap.dedent(
-        f"""
-        下面是股票 {symbol} 最近的部分財報數據（可能不完整）：
-
-        {json.dumps(data_payload, ensure_ascii=False, indent=2, default=str)}
-
-        請整理成一段易讀的「財報亮點 / 風險 / 展望」說明，條列重點。
-        """
-    )
-
-    try:
-        return _call_llm(model=model, system_prompt=system_prompt, user_prompt=user_prompt)
-    except Exception:
-        return _rule_based_earnings(symbol)
-
-
-# ============ Gemini 版：逐段翻譯 ============
-def translate_transcript_paragraphs(
-    text: str,
-    model: str | None = None,
-) -> List[Tuple[str, str]]:
-    """
-    將逐字稿切段 → 每段英文 → 中文翻譯。
-    若無模型就用「假翻譯」。
-    """
-    text = text.replace("\r", "\n")
-    parts = [p.strip() for p in text.split("\n") if p.strip()]
-    results: List[Tuple[str, str]] = []
-
-    if (model is None) or (not GOOGLE_API_KEY):
-        for p in parts:
-            zh = f"（此段落的中文摘要示意）{p[:40]}..."
-            results.append((p, zh))
-        return results
-
-    system_prompt = textwrap.dedent(
-        """
-        你是一位精通英文與繁體中文的財報口譯人員。
-        對於每一段英文逐字稿，請給出：
-        - 精準、自然的繁體中文翻譯（不要加自己評論）
-        """
-    )
-
-    for p in parts:
-        try:
-            zh = _call_llm(
-                model=model,
-                system_prompt=system_prompt,
-                user_prompt=p,
-            )
-        except Exception:
-            zh = f"（翻譯失敗，以下為原文前 40 字）{p[:40]}..."
-        results.append((p, zh))
-
-    return results
-
-
-# ============ Gemini 版：整份文字摘要 ============
-def analyze_earnings_transcript(
-    symbol: str,
-    text: str,
-    model: str | None = None,
-) -> str:
-    """
-    針對整份文字檔做摘要。若沒有模型則給規則版摘要。
-    """
-    clean = clean_text(text)
-
-    if (model is None) or (not GOOGLE_API_KEY):
-        word_count = len(clean.split())
-        key_terms = ["guidance", "revenue", "margin", "profit"]
-        found = [k for k in key_terms if k in clean.lower()]
-
-        txt = f"""
-        ## 📘 文字摘要（規則版）
-
-        - 文字長度：約 {word_count} 個英文單字或詞。
-        - 偵測到的財務關鍵字：{', '.join(found) if found else '無明顯關鍵字'}
-
-        ⚠ 未啟用 LLM，因此僅能提供非常粗略的資訊。
-        """
-        return textwrap.dedent(txt)
-
-    system_prompt = textwrap.dedent(
-        f"""
-        你是一位專門閱讀財報逐字稿與財經新聞的分析師，請使用繁體中文回答。
-
-        目標：針對股票 {symbol} 的這份文字內容，整理出：
-        1. 主題與背景是什麼（1 段話）
-        2. 正面亮點（2–5 點）
-        3. 潛在風險或市場擔憂（2–5 點）
-        4. 管理階層對未來的展望或指引（若有）
-        5. 對一般投資人的提醒：僅作資訊參考，不是投資建議。
-
-        嚴禁捏造不存在的具體數字；若原文沒有寫，就以「原文未明確提到」表達。
-        """
-    )
-
-    user_prompt = clean[:15000]  # 避免 prompt 過長
-
-    try:
-        return _call_llm(model=model, system_prompt=system_prompt, user_prompt=user_prompt)
-    except Exception:
-        word_count = len(clean.split())
-        txt = f"""
-        ## 📘 文字摘要（規則版）
-
-        - 文字長度：約 {word_count} 個英文單字或詞。
-        - 由於 LLM 呼叫失敗，僅能給出長度資訊，無法產生完整內容摘要。
-        """
-        return textwrap.dedent(txt)
+# core/ai_analyzer.py
+# -------------------------------------------------
+# 使用 Google Gemini 作為 LLM：
+# - 讀取環境變數 GOOGLE_API_KEY
+# - 有 key → 用 Gemini 回覆
+# - 沒 key 或出錯 → fallback 規則版
+# - 保留 Question Guard（review_question）
+# -------------------------------------------------
+
+from __future__ import annotations
+
+import datetime
+import functools
+import hashlib
+import os
+import re
+import json
+import textwrap
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Tuple, Optional
+
+import pandas as pd
+
+# =============== Google Gemini SDK ===============
+# pip install google-generativeai
+import google.generativeai as genai
+
+GOOGLE_API_KEY: Optional[str] = os.getenv("GOOGLE_API_KEY")
+
+if GOOGLE_API_KEY:
+    genai.configure(api_key=GOOGLE_API_KEY)
+
+
+# ================= 工具：清理文字 =================
+_WS_RE = re.compile(r"\s+")
+
+
+# 超過這個長度不進 lru_cache：逐字稿動輒幾 MB，
+# 被 cache 釘住 256 份等於整個 process 的記憶體都吃掉
+_CLEAN_CACHE_MAX_LEN = 2048
+
+
+def _clean_text_impl(text: str) -> str:
+    # 已經乾淨的字串（無換行、無連續空白）不用跑 regex
+    if (
+        "\r" not in text
+        and "\n" not in text
+        and "\t" not in text
+        and "  " not in text
+    ):
+        return text.strip()
+    text = text.replace("\r", " ").replace("\n", " ")
+    text = _WS_RE.sub(" ", text)
+    return text.strip()
+
+
+# Streamlit 每次互動都整份 rerun，同一段輸入會被反覆清理；
+# lru_cache 讓相同字串（str→str，可安全快取）直接回放
+@functools.lru_cache(maxsize=256)
+def _clean_text_cached(text: str) -> str:
+    return _clean_text_impl(text)
+
+
+def clean_text(text: str) -> str:
+    if not text:
+        return ""
+    # 短輸入（問題、提示詞片段）才值得快取；長文直接清
+    if len(text) > _CLEAN_CACHE_MAX_LEN:
+        return _clean_text_impl(text)
+    return _clean_text_cached(text)
+
+
+# ============ 選配：LLM 回應落地快取 ============
+# 設 LLM_CACHE=1 啟用（需另外 pip install diskcache）：
+# 同一組 (model, system, user) prompt 直接回放上次的回應，
+# 重看同一檔股票 / 重傳同一份逐字稿時 API 花費歸零
+_llm_cache = None
+if os.getenv("LLM_CACHE") == "1":
+    try:
+        import diskcache
+
+        _llm_cache = diskcache.Cache(
+            os.path.expanduser("~/.stock_ai_llm_cache")
+        )
+    except Exception:
+        _llm_cache = None
+
+
+# ============ 速率限制 + 退避重試 ============
+# 併發翻譯很容易撞免費層的 15 RPM 上限；
+# 出手前先過 token bucket（留 1 個請求當緩衝），429 再指數退避重試
+_RPM_LIMIT = 14
+_call_times: deque = deque()
+_rate_lock = threading.Lock()
+
+try:
+    from google.api_core.exceptions import ResourceExhausted as _RateLimitError
+except ImportError:
+    _RateLimitError = None
+
+
+def _acquire_rate_slot() -> None:
+    """卡到額度才回傳；必要時睡到最舊的請求滿 60 秒。"""
+    while True:
+        with _rate_lock:
+            now = time.monotonic()
+            while _call_times and now - _call_times[0] >= 60.0:
+                _call_times.popleft()
+            if len(_call_times) < _RPM_LIMIT:
+                _call_times.append(now)
+                return
+            wait = 60.0 - (now - _call_times[0])
+        time.sleep(max(wait, 0.1))
+
+
+def _is_rate_limited(exc: Exception) -> bool:
+    if _RateLimitError is not None and isinstance(exc, _RateLimitError):
+        return True
+    return "429" in str(exc)
+
+
+# =========== 內部：呼叫 Gemini 模型 ===========
+@functools.lru_cache(maxsize=8)
+def _get_model(model: str) -> genai.GenerativeModel:
+    """同名模型整個 process 只建一個 client，逐段翻譯等熱路徑不用每次重建。"""
+    return genai.GenerativeModel(model)
+
+
+def _call_llm_stream(
+    model: str, system_prompt: str, user_prompt: str, response_schema: dict | None = None
+):
+    """
+    串流版共用 LLM 呼叫：逐塊 yield 生成內容。
+    完整回應要等數秒，先讓第一批 token 在幾百毫秒內出現，
+    給 UI 層用 st.write_stream 邊收邊顯示。
+    指定 response_schema 時改走 JSON mode，輸出保證符合 schema。
+    """
+    if not GOOGLE_API_KEY:
+        raise RuntimeError("GOOGLE_API_KEY not found")
+
+    gm = _get_model(model)
+
+    # Gemini 不區分 system/user，我們直接組一個完整 prompt
+    prompt = system_prompt.strip() + "\n\n=== 使用者輸入 ===\n" + user_prompt.strip()
+
+    kwargs = {}
+    if response_schema is not None:
+        kwargs["generation_config"] = genai.GenerationConfig(
+            response_mime_type="application/json",
+            response_schema=response_schema,
+        )
+
+    _acquire_rate_slot()
+    for chunk in gm.generate_content(prompt, stream=True, **kwargs):
+        yield chunk.text or ""
+
+
+def _call_llm(
+    model: str,
+    system_prompt: str,
+    user_prompt: str,
+    response_schema: dict | None = None,
+) -> str:
+    """
+    共用 LLM 呼叫（一次拿完整字串）：
+    - model: "gemini-2.0-flash" 或 "gemini-1.5-pro"
+    - system_prompt: 系統角色
+    - user_prompt: 使用者問題 + 數據
+    - response_schema: 給了就走 JSON mode，回傳符合 schema 的 JSON 字串
+    """
+    if not GOOGLE_API_KEY:
+        raise RuntimeError("GOOGLE_API_KEY not found")
+
+    if _llm_cache is not None:
+        schema_part = (
+            json.dumps(response_schema, sort_keys=True) if response_schema else ""
+        )
+        key = hashlib.sha256(
+            "\x00".join((model, system_prompt, user_prompt, schema_part)).encode("utf-8")
+        ).hexdigest()
+        cached = _llm_cache.get(key)
+        if cached is not None:
+            return cached
+
+    # 429 退避重試最多 3 次；其他錯誤照舊往外拋給呼叫端 fallback
+    for attempt in range(3):
+        try:
+            text = "".join(
+                _call_llm_stream(model, system_prompt, user_prompt, response_schema)
+            ).strip()
+            break
+        except Exception as exc:
+            if attempt < 2 and _is_rate_limited(exc):
+                time.sleep(2 ** attempt)
+                continue
+            raise
+
+    if _llm_cache is not None:
+        _llm_cache.set(key, text, expire=7 * 86400)
+    return text
+
+
+# ========= 規則版分析（fallback 用） =========
+def _rule_based_stock_analysis(
+    symbol: str,
+    indicators: dict,
+    user_question: str | None,
+) -> str:
+    val = indicators.get("valuation", {})
+    mom = indicators.get("momentum", {})
+
+    latest_price = val.get("latestPrice")
+    pe = val.get("trailingPE")
+    fpe = val.get("forwardPE")
+
+    one_m = mom.get("oneMonthReturn")
+    three_m = mom.get("threeMonthReturn")
+
+    def fmt_pct(x):
+        if x is None:
+            return "N/A"
+        return f"{x * 100:.2f}%"
+
+    trend = "-"
+    if isinstance(three_m, (int, float)):
+        if three_m > 0.05:
+            trend = "明顯上升"
+        elif three_m < -0.05:
+            trend = "明顯下跌"
+        else:
+            trend = "相對震盪整理"
+
+    question_part = f"\n\n你問的問題：「{user_question}」\n" if user_question else ""
+
+    txt = f"""
+    ## 📈 股票分析（規則版，未啟用 Gemini）
+
+    **股票：{symbol}**
+
+    ### 🔹 1. 基本估值
+    - 現價：{latest_price}
+    - 本益比（PE）：{pe}
+    - 預估本益比（Forward PE）：{fpe}
+
+    ### 🔹 2. 股價動能
+    - 1 個月報酬：{fmt_pct(one_m)}（短期情緒參考）
+    - 3 個月報酬：{fmt_pct(three_m)} → **{trend}**
+
+    ### 🔹 3. 亮點（根據簡單規則推斷）
+    - 3M 上漲視為多方氣氛較強。
+    - Forward PE 若低於 PE，代表市場對未來成長有期待。
+
+    ### 🔹 4. 風險
+    - 若 3M 報酬率為負，須注意可能的下跌趨勢。
+    - 若 PE 遠高於產業平均，可能有估值過高風險。
+
+    ### 🔹 5. 說明
+    ⚠ 目前尚未啟用 Google Gemini 模型，
+    因此本分析為「規則 + 模板」自動生成。
+
+    {question_part}
+    """
+    return textwrap.dedent(txt)
+
+
+def _rule_based_earnings(symbol: str) -> str:
+    txt = f"""
+    ## 📝 財報亮點摘要（規則版）
+
+    股票：{symbol}
+
+    ### 🔹 可能的亮點
+    - 最近季度營收高於前季，通常被視為正向訊號。
+    - 毛利率提升代表成本控制較佳。
+
+    ### 🔹 潛在風險
+    - 淨利較上季下滑時，需留意獲利穩定度。
+    - 若營業活動現金流連續下滑，可能埋有財務壓力。
+
+    ### 🔹 提醒
+    ⚠ 本段仍為規則運算，並非真正 LLM 解析逐字稿與財報。
+    """
+    return textwrap.dedent(txt)
+
+
+# =============== 問題審查器（Question Guard） ===============
+_FIN_KW_ZH = [
+    "營收",
+    "獲利",
+    "毛利",
+    "淨利",
+    "成長",
+    "估值",
+    "本益比",
+    "股價",
+    "股息",
+    "配息",
+    "現金流",
+    "財報",
+    "季度",
+    "展望",
+    "風險",
+]
+
+_FIN_KW_EN = [
+    "revenue",
+    "profit",
+    "margin",
+    "guidance",
+    "valuation",
+    "dividend",
+    "eps",
+    "cash flow",
+    "earnings",
+    "quarter",
+    "risk",
+    "growth",
+]
+
+# 中英關鍵字併成一條 alternation，一次掃描取代 27 次 substring 搜尋
+_FIN_RE = re.compile(
+    "|".join(map(re.escape, _FIN_KW_ZH + _FIN_KW_EN)), re.IGNORECASE
+)
+
+# 「看起來像正常文字」的字元集合（中英數）
+_VALID_CHARS = re.compile(r"[A-Za-z0-9一-鿿]")
+
+# 群組用 (?:...)：findall 才會回傳整個年份而不是只有前兩碼
+_YEAR_RE = re.compile(r"(?:19|20)\d{2}")
+
+
+def review_question(
+    question: str,
+    symbol: str,
+    price_history=None,
+    financials=None,
+) -> Dict[str, Any]:
+    """
+    回傳：
+    {
+      "level": "ok" | "warn" | "reject",
+      "reason": "...",
+      "message": "要顯示給使用者看的文字",
+      "system_hint": "要塞進 system prompt 的補充說明（可為空字串）"
+    }
+    """
+    q = clean_text(question)
+    if not q:
+        return {
+            "level": "reject",
+            "reason": "empty",
+            "message": "❌ 問題內容是空的，請具體輸入想分析的重點或疑問。",
+            "system_hint": "",
+        }
+
+    # 1) 太短直接拒絕
+    if len(q) <= 3:
+        return {
+            "level": "reject",
+            "reason": "too_short",
+            "message": "❌ 問題太短了，請再具體一些（例如：想看哪一段期間、估值、財報或風險？）。",
+            "system_hint": "",
+        }
+
+    # 2) 明顯亂打（大量標點 / 符號）——要在 happy path 之前擋，
+    #    不然「@@@@風險@@@@」這種夾帶關鍵字的亂碼會被放行。
+    #    只要數量不要內容：把合法字元刪掉看剩多少，
+    #    不配置一個每字元一個字串的 findall 清單
+    n_valid = len(q) - len(_VALID_CHARS.sub("", q))
+    if n_valid / len(q) < 0.35:
+        return {
+            "level": "reject",
+            "reason": "gibberish",
+            "message": "❌ 這個問題看起來像是隨機字元或無法判讀的內容，請重新敘述你的問題。",
+            "system_hint": "",
+        }
+
+    # 3) 最常見的 happy path：有財經關鍵字、又沒提到年份，
+    #    就直接放行，不碰 price_history / financials
+    has_fin_kw = bool(_FIN_RE.search(q))
+    mentions_year = bool(_YEAR_RE.search(q))
+    if has_fin_kw and not mentions_year:
+        return {
+            "level": "ok",
+            "reason": "pass",
+            "message": "",
+            "system_hint": "",
+        }
+
+    warn_msgs: List[str] = []
+    system_hints: List[str] = []
+
+    if not has_fin_kw:
+        warn_msgs.append(
+            "⚠ 這個問題沒有明顯的財經 / 股價 / 財報關鍵字，我會盡量從一般角度回答，"
+            "但也可能提醒你這個工具主要是用來做股票與財報分析。"
+        )
+        system_hints.append(
+            "若使用者提問與股票 / 財報 /金融無直接關聯，請先說明本工具主要用途，"
+            "再視情況簡要回答；若完全無關，建議禮貌回覆無法回答。"
+        )
+
+    # 4) 年份範圍檢查（從問題抓出年份）——只掃一次，
+    #    問題裡根本沒年份時連資料端的年份都不用抽
+    years_in_q = list(map(int, _YEAR_RE.findall(q))) if mentions_year else []
+
+    # 年份改用向量化 accessor 一次抽出，不逐列做 Python 屬性查找
+    data_years: List[int] = []
+    if years_in_q and price_history is not None and hasattr(price_history, "index"):
+        try:
+            data_years.extend(price_history.index.year.unique().tolist())
+        except Exception:
+            pass
+
+    if years_in_q and financials and isinstance(financials, dict):
+        inc = financials.get("income_q")
+        if inc is not None and not inc.empty and "period" in inc.columns:
+            try:
+                per = inc["period"]
+                if pd.api.types.is_datetime64_any_dtype(per):
+                    years = per.dt.year.dropna().astype(int)
+                else:
+                    # 字串型 period（如 "2024Q1"）：整欄一次 str.extract，
+                    # 不逐元素 getattr + 例外處理
+                    years = (
+                        per.astype(str)
+                        .str.extract(r"((?:19|20)\d{2})")[0]
+                        .dropna()
+                        .astype(int)
+                    )
+                data_years.extend(years.unique().tolist())
+            except Exception:
+                pass
+
+    if data_years and years_in_q:
+        min_y, max_y = min(data_years), max(data_years)
+        out_of_range = [y for y in years_in_q if y < min_y or y > max_y]
+        if out_of_range:
+            warn_msgs.append(
+                f"⚠ 問題中提到的年份 {sorted(set(out_of_range))} 超出目前資料範圍 "
+                f"（約 {min_y} ~ {max_y}），回答時會盡量以可取得的年份說明，並提醒這一點。"
+            )
+            system_hints.append(
+                "使用者問題涉及資料範圍以外的年份時，請先明確說明資料僅涵蓋的區間，"
+                "再依現有資料做推論；對於沒有資料的年份，不要虛構具體數字或事件。"
+            )
+
+    if not warn_msgs:
+        return {
+            "level": "ok",
+            "reason": "pass",
+            "message": "",
+            "system_hint": "",
+        }
+
+    return {
+        "level": "warn",
+        "reason": "warn",
+        "message": "\n\n".join(warn_msgs),
+        "system_hint": "\n".join(system_hints),
+    }
+
+
+# ============ Gemini 版：主分析（AI 數據分析） ============
+# system prompt 做成模組常數、不插任何變動內容：
+# Gemini 的 implicit caching 只在 prompt「前綴」逐字節相同時命中，
+# guard_hint / 使用者提問一律移到 user_prompt 的尾端
+_ANALYSIS_SYSTEM = textwrap.dedent(
+    """
+    你是一位專門分析「美股」與「財報」的專業投資顧問，回答時請使用**繁體中文**，
+    風格清楚、有條理、但不要過度艱深。
+
+    核心原則：
+    1. 僅能根據使用者提供的指標資料與一般常識進行推理，不可捏造具體數字、年份或事件。
+    2. 若無法從資料中合理推論答案，要明確說「目前資料無法判斷」或「缺乏足夠資料」。
+    3. 若問題與股票 / 財報 / 投資風險無關，先說本工具的用途，再視情況簡要回答或婉拒。
+    4. 盡量給出「亮點」、「風險」、「需要關注的指標」三個層次的說明。
+    5. 若使用者輸入最後附有額外的 guard 說明，必須一併遵守。
+    """
+)
+
+# user_prompt 模板也在 import 時 dedent 好，每次呼叫只做 .format
+_ANALYSIS_USER_TMPL = textwrap.dedent(
+    """
+    請根據下面的指標資料，給出一份結構化的分析報告，格式包含：
+    1. 估值概況（本益比、股價淨值比等，大致是偏貴、偏便宜、還是合理區間）
+    2. 近期股價動能（1M / 3M 報酬率、波動度與高低點的解讀）
+    3. 亮點（列出 2–4 點）
+    4. 風險與需要特別留意的項目（列出 2–4 點）
+    5. 給一般投資人的提醒（不要當作投資建議）
+
+    以下是關於股票 {symbol} 的指標資料（JSON）：
+
+    {payload_json}
+
+    使用者目前的提問是：
+    {question}
+    """
+)
+
+
+def _analysis_user_prompt(
+    symbol: str,
+    indicators: dict,
+    user_question: str | None,
+    guard_hint: str | None,
+) -> str:
+    """組主分析的 user_prompt（完整版與串流版共用）。"""
+    val = indicators.get("valuation", {})
+    mom = indicators.get("momentum", {})
+
+    def safe_float(x):
+        try:
+            return float(x)
+        except Exception:
+            return None
+
+    payload = {
+        "symbol": symbol,
+        "valuation": {
+            "latestPrice": safe_float(val.get("latestPrice")),
+            "trailingPE": safe_float(val.get("trailingPE")),
+            "forwardPE": safe_float(val.get("forwardPE")),
+            "priceToBook": safe_float(val.get("priceToBook")),
+        },
+        "momentum": {
+            "oneMonthReturn": safe_float(mom.get("oneMonthReturn")),
+            "threeMonthReturn": safe_float(mom.get("threeMonthReturn")),
+            "volatility3m": safe_float(mom.get("volatility3m")),
+            "high3m": safe_float(mom.get("high3m")),
+            "low3m": safe_float(mom.get("low3m")),
+        },
+    }
+
+    # 壓縮 JSON：縮排與空白是白白計費的 token，模型不需要
+    user_prompt = _ANALYSIS_USER_TMPL.format(
+        symbol=symbol,
+        payload_json=json.dumps(
+            payload, ensure_ascii=False, separators=(",", ":"), default=str
+        ),
+        question=user_question
+        or "「沒有額外提問，只是想看這檔股票在目前區間的綜合分析。」",
+    )
+    if guard_hint:
+        user_prompt += f"\n=== Guard 補充說明 ===\n{guard_hint}\n"
+    return user_prompt
+
+
+# 主分析改走 JSON mode：輸出保證是這個形狀的 dict，
+# 不用再靠模型乖乖排 markdown 標題，輸出 token 也更省；
+# 版面改在本地組，UI 呈現不變
+_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "valuation_summary": {"type": "string"},
+        "momentum_summary": {"type": "string"},
+        "highlights": {"type": "array", "items": {"type": "string"}},
+        "risks": {"type": "array", "items": {"type": "string"}},
+        "reminder": {"type": "string"},
+    },
+    "required": [
+        "valuation_summary",
+        "momentum_summary",
+        "highlights",
+        "risks",
+        "reminder",
+    ],
+}
+
+
+def _has_enough_indicators(indicators: dict) -> bool:
+    """新股 / 冷門股常整組指標都是 None；少於 3 個有效值就不值得打 LLM。"""
+    val = indicators.get("valuation", {})
+    mom = indicators.get("momentum", {})
+    non_null = sum(1 for v in {**val, **mom}.values() if v is not None)
+    return non_null >= 3
+
+
+def _format_analysis_report(report: dict) -> str:
+    """把 JSON mode 的結構化結果排成原本的 markdown 版面。"""
+    highlights = "\n".join(f"- {h}" for h in report.get("highlights", []))
+    risks = "\n".join(f"- {r}" for r in report.get("risks", []))
+    return (
+        f"### 🔹 1. 估值概況\n{report.get('valuation_summary', '')}\n\n"
+        f"### 🔹 2. 近期股價動能\n{report.get('momentum_summary', '')}\n\n"
+        f"### 🔹 3. 亮點\n{highlights}\n\n"
+        f"### 🔹 4. 風險與需要留意的項目\n{risks}\n\n"
+        f"### 🔹 5. 提醒\n{report.get('reminder', '')}\n"
+    )
+
+
+def generate_analysis(
+    symbol: str,
+    indicators: dict,
+    price_history,
+    user_question: str | None = None,
+    model: str | None = None,
+    guard_hint: str | None = None,
+) -> str:
+    """
+    若有 GOOGLE_API_KEY 且指定 model → 呼叫 Gemini
+    否則自動 fallback 規則版。
+    """
+    if (model is None) or (not GOOGLE_API_KEY):
+        return _rule_based_stock_analysis(symbol, indicators, user_question)
+
+    # 指標幾乎全空時，LLM 只會回「資料不足」——直接用本地規則版
+    if not _has_enough_indicators(indicators):
+        return _rule_based_stock_analysis(symbol, indicators, user_question)
+
+    user_prompt = _analysis_user_prompt(symbol, indicators, user_question, guard_hint)
+
+    try:
+        raw = _call_llm(
+            model=model,
+            system_prompt=_ANALYSIS_SYSTEM,
+            user_prompt=user_prompt,
+            response_schema=_ANALYSIS_SCHEMA,
+        )
+        return _format_analysis_report(json.loads(raw))
+    except Exception:
+        return _rule_based_stock_analysis(symbol, indicators, user_question)
+
+
+def generate_analysis_stream(
+    symbol: str,
+    indicators: dict,
+    price_history,
+    user_question: str | None = None,
+    model: str | None = None,
+    guard_hint: str | None = None,
+):
+    """
+    串流版主分析：逐塊 yield，給 st.write_stream 邊收邊顯示。
+    無模型 / 呼叫失敗時 yield 規則版全文（一塊）。
+    """
+    if (model is None) or (not GOOGLE_API_KEY):
+        yield _rule_based_stock_analysis(symbol, indicators, user_question)
+        return
+
+    if not _has_enough_indicators(indicators):
+        yield _rule_based_stock_analysis(symbol, indicators, user_question)
+        return
+
+    user_prompt = _analysis_user_prompt(symbol, indicators, user_question, guard_hint)
+
+    try:
+        yield from _call_llm_stream(
+            model=model, system_prompt=_ANALYSIS_SYSTEM, user_prompt=user_prompt
+        )
+    except Exception:
+        yield _rule_based_stock_analysis(symbol, indicators, user_question)
+
+
+# ============ Gemini 版：財報亮點 ============
+_EARNINGS_SYSTEM = textwrap.dedent(
+    """
+    你是一位專門閱讀美股財報與法說會資訊的分析師，回答以繁體中文。
+    目標是從有限的 earnings / 損益表資訊中，整理出：
+    1. 最近幾季的營收與獲利趨勢（成長或衰退、是否穩定）
+    2. 毛利率 / 營業利益率是否改善或惡化（若有資料）
+    3. 管理階層可能關注的重點與風險（根據數字合理推論）
+    4. 給一般投資人的提醒（不是投資建議）
+
+    若發現資料極少或欄位不足，請明確說明限制，不要胡亂猜測。
+    """
+)
+
+_EARNINGS_USER_TMPL = textwrap.dedent(
+    """
+    下面是股票 {symbol} 最近的部分財報數據（可能不完整）：
+
+    {payload_json}
+
+    請整理成一段易讀的「財報亮點 / 風險 / 展望」說明，條列重點。
+    """
+)
+
+
+def extract_earnings_insights(
+    symbol: str,
+    earnings_data,
+    financials,
+    model: str | None = None,
+) -> str:
+    """
+    傳入 yfinance earnings / financials，請 LLM 幫忙整理財報亮點。
+    沒有模型或金鑰時就用規則版。
+    """
+    if (model is None) or (not GOOGLE_API_KEY):
+        return _rule_based_earnings(symbol)
+
+    income_q = None
+    if financials and isinstance(financials, dict):
+        income_q = financials.get("income_q")
+
+    # 損益表和 earnings 都拿不到時，不花一次 API 叫模型說「資料不足」
+    if (income_q is None or income_q.empty) and getattr(earnings_data, "empty", True):
+        return _rule_based_earnings(symbol)
+
+    income_json = None
+    if income_q is not None and not income_q.empty:
+        try:
+            income_json = income_q.head(4).to_dict(orient="records")
+        except Exception:
+            income_json = None
+
+    # earnings 的 row index 是年度標籤，要用 orient="index" 留著，
+    # 不然模型只看到一排數字不知道是哪一年；token 省在緊湊的 separators
+    data_payload = {
+        "symbol": symbol,
+        "earnings_table": getattr(earnings_data, "to_dict", lambda **k: None)(
+            orient="index"
+        )
+        if hasattr(earnings_data, "to_dict")
+        else None,
+        "income_q": income_json,
+    }
+
+    user_prompt = _EARNINGS_USER_TMPL.format(
+        symbol=symbol,
+        payload_json=json.dumps(
+            data_payload, ensure_ascii=False, separators=(",", ":"), default=str
+        ),
+    )
+
+    try:
+        return _call_llm(model=model, system_prompt=_EARNINGS_SYSTEM, user_prompt=user_prompt)
+    except Exception:
+        return _rule_based_earnings(symbol)
+
+
+# ============ Gemini 版：逐段翻譯 ============
+_TRANSLATE_SYSTEM = textwrap.dedent(
+    """
+    你是一位精通英文與繁體中文的財報口譯人員。
+    對於每一段英文逐字稿，請給出：
+    - 精準、自然的繁體中文翻譯（不要加自己評論）
+    """
+)
+
+
+def translate_transcript_paragraphs(
+    text: str,
+    model: str | None = None,
+) -> List[Tuple[str, str]]:
+    """
+    將逐字稿切段 → 每段英文 → 中文翻譯。
+    若無模型就用「假翻譯」。
+    """
+    text = text.replace("\r", "\n")
+    parts = [p.strip() for p in text.split("\n") if p.strip()]
+    results: List[Tuple[str, str]] = []
+
+    if (model is None) or (not GOOGLE_API_KEY):
+        for p in parts:
+            zh = f"（此段落的中文摘要示意）{p[:40]}..."
+            results.append((p, zh))
+        return results
+
+    def _safe_translate(p: str) -> str:
+        try:
+            return _call_llm(
+                model=model,
+                system_prompt=_TRANSLATE_SYSTEM,
+                user_prompt=p,
+            )
+        except Exception:
+            return f"（翻譯失敗，以下為原文前 40 字）{p[:40]}..."
+
+    # 逐字稿常有重複的短句（"Thank you."、主持人口頭禪、講者標籤），
+    # 先去重、每個獨特段落只翻一次，再照原始順序攤回去
+    uniq = list(dict.fromkeys(parts))
+
+    # 逐段序列呼叫時整體等待是「段數 × LLM 延遲」；
+    # 段與段互相獨立，用 thread pool 併發送出，executor.map 保序
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        translations = dict(zip(uniq, ex.map(_safe_translate, uniq)))
+
+    results.extend((p, translations[p]) for p in parts)
+    return results
+
+
+# ============ Token 預算截斷 ============
+# 粗估 token 數：CJK 約 1 字 1 token、其餘文字約 4 字元 1 token。
+# 純字元切片對中文稿會低估 4 倍、可能直接超過模型上限被打 400
+_CJK_RE = re.compile(r"[一-鿿]")
+
+
+def _approx_tokens(text: str) -> int:
+    n_cjk = len(text) - len(_CJK_RE.sub("", text))
+    return n_cjk + (len(text) - n_cjk) // 4
+
+
+def _truncate_to_token_budget(text: str, budget: int) -> str:
+    """把文字截到大約 budget 個 token 以內（對前綴長度做二分搜尋）。"""
+    if _approx_tokens(text) <= budget:
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if _approx_tokens(text[:mid]) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo]
+
+
+# ============ Gemini 版：整份文字摘要 ============
+_TRANSCRIPT_SYSTEM = textwrap.dedent(
+    """
+    你是一位專門閱讀財報逐字稿與財經新聞的分析師，請使用繁體中文回答。
+
+    目標：針對使用者輸入開頭標示的股票，就其文字內容整理出：
+    1. 主題與背景是什麼（1 段話）
+    2. 正面亮點（2–5 點）
+    3. 潛在風險或市場擔憂（2–5 點）
+    4. 管理階層對未來的展望或指引（若有）
+    5. 對一般投資人的提醒：僅作資訊參考，不是投資建議。
+
+    嚴禁捏造不存在的具體數字；若原文沒有寫，就以「原文未明確提到」表達。
+    """
+)
+
+
+# 同一份逐字稿可能被反覆分析（換模型、換問法）；
+# 用 Gemini 的 explicit context caching 把稿子本體掛在伺服器端（TTL 1 小時），
+# 之後的呼叫只送差異部分，稿子的 token 走折扣價
+_transcript_cc: Dict[str, Any] = {}
+
+# 低於服務端最小可快取大小（約 4096 token）的內容直接走一般路徑，
+# 不發一個注定失敗的 CachedContent.create
+_CC_MIN_TOKENS = 4096
+
+
+def _transcript_model(model: str, transcript: str):
+    """
+    回傳 (掛著這份逐字稿快取的 GenerativeModel, 快取 key)；
+    失敗就丟例外給呼叫端 fallback。伺服器端 TTL 只有 1 小時，
+    本地過期的條目要先丟掉重建，不能對著死掉的快取打。
+    """
+    key = hashlib.sha256((model + "\x00" + transcript).encode("utf-8")).hexdigest()
+    cc = _transcript_cc.get(key)
+    if cc is not None:
+        expire = getattr(cc, "expire_time", None)
+        if expire is not None and expire <= datetime.datetime.now(datetime.timezone.utc):
+            _transcript_cc.pop(key, None)
+            cc = None
+    if cc is None:
+        cc = genai.caching.CachedContent.create(
+            model=model,
+            system_instruction=_TRANSCRIPT_SYSTEM.strip(),
+            contents=[transcript],
+            ttl=datetime.timedelta(hours=1),
+        )
+        _transcript_cc[key] = cc
+    return genai.GenerativeModel.from_cached_content(cached_content=cc), key
+
+
+def analyze_earnings_transcript(
+    symbol: str,
+    text: str,
+    model: str | None = None,
+) -> str:
+    """
+    針對整份文字檔做摘要。若沒有模型則給規則版摘要。
+    """
+    clean = clean_text(text)
+
+    if (model is None) or (not GOOGLE_API_KEY):
+        word_count = len(clean.split())
+        key_terms = ["guidance", "revenue", "margin", "profit"]
+        found = [k for k in key_terms if k in clean.lower()]
+
+        txt = f"""
+        ## 📘 文字摘要（規則版）
+
+        - 文字長度：約 {word_count} 個英文單字或詞。
+        - 偵測到的財務關鍵字：{', '.join(found) if found else '無明顯關鍵字'}
+
+        ⚠ 未啟用 LLM，因此僅能提供非常粗略的資訊。
+        """
+        return textwrap.dedent(txt)
+
+    # 以 token 預算截斷而不是字元數：英文稿可以放比 15000 字元更多，
+    # 中文稿則不會爆掉模型上限
+    body = _truncate_to_token_budget(clean, 12000)
+
+    # 夠長的稿子先試 explicit context caching：稿子掛在伺服器端，
+    # 重複分析只送「股票代號 + 指示」這一小段
+    if _approx_tokens(body) >= _CC_MIN_TOKENS:
+        cc_key = None
+        try:
+            gm, cc_key = _transcript_model(model, body)
+            # 跟 _call_llm 走同一套節流 + 429 退避：
+            # 這一發常緊接在逐段翻譯把 RPM 打滿之後
+            for attempt in range(3):
+                try:
+                    _acquire_rate_slot()
+                    resp = gm.generate_content(
+                        f"股票代號：{symbol}\n請依照系統指示整理這份內容的摘要。"
+                    )
+                    break
+                except Exception as exc:
+                    if attempt < 2 and _is_rate_limited(exc):
+                        time.sleep(2**attempt)
+                        continue
+                    raise
+            return (resp.text or "").strip()
+        except Exception as exc:
+            # 不支援 / 額度 / 伺服器端快取已失效等——把本地條目丟掉，
+            # 下次才會重新 create，而不是每次都對死快取打一發再 fallback；
+            # 單純被限流的快取還是好的，留著
+            if cc_key is not None and not _is_rate_limited(exc):
+                _transcript_cc.pop(cc_key, None)
+            # 退回一般呼叫
+
+    # 股票代號移到 user_prompt，讓 system 前綴對所有股票逐字節相同
+    user_prompt = f"股票代號：{symbol}\n\n" + body
+
+    try:
+        return _call_llm(model=model, system_prompt=_TRANSCRIPT_SYSTEM, user_prompt=user_prompt)
+    except Exception:
+        word_count = len(clean.split())
+        txt = f"""
+        ## 📘 文字摘要（規則版）
+
+        - 文字長度：約 {word_count} 個英文單字或詞。
+        - 由於 LLM 呼叫失敗，僅能給出長度資訊，無法產生完整內容摘要。
+        """
+        return textwrap.dedent(txt)
@@ -1,10 +1,16 @@
-import yfinance as yf
 import pandas as pd
 
+# yfinance 是冷啟動最大的 import，延後到真的要自建 Ticker 才載入；
+# app 端走 _get_ticker 傳進來時整個模組載入都省掉
 
-def fetch_us_stock(symbol: str, period="3mo"):
+
+def fetch_us_stock(symbol: str, period="3mo", ticker=None):
     symbol = symbol.upper()
-    ticker = yf.Ticker(symbol)
+    # 可傳入共用的 Ticker，避免每個 helper 各自重跑 cookie/crumb 握手
+    if ticker is None:
+        import yfinance as yf  # 延後載入
+
+        ticker = yf.Ticker(symbol)
 
     # 價格資料
     hist = ticker.history(period=period)
@@ -20,16 +26,22 @@ def fetch_us_stock(symbol: str, period="3mo"):
     }
 
 
-def fetch_earnings_summary(symbol: str):
-    ticker = yf.Ticker(symbol)
+def fetch_earnings_summary(symbol: str, ticker=None):
+    if ticker is None:
+        import yfinance as yf  # 延後載入
+
+        ticker = yf.Ticker(symbol)
     try:
         return ticker.earnings or pd.DataFrame()
     except:
         return pd.DataFrame()
 
 
-def fetch_financial_statements(symbol: str):
-    ticker = yf.Ticker(symbol)
+def fetch_financial_statements(symbol: str, ticker=None):
+    if ticker is None:
+        import yfinance as yf  # 延後載入
+
+        ticker = yf.Ticker(symbol)
 
     try:
         income_q = ticker.quarterly_financials.T
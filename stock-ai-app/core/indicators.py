@@ -1,46 +1,53 @@
-import pandas as pd
-
-
-def compute_indicators(hist: pd.DataFrame, info: dict):
-    latest_price = hist["Close"].iloc[-1] if not hist.empty else None
-
-    # --- 動能指標 ---
-    mom = {}
-
-    if len(hist) >= 22:
-        mom["oneMonthReturn"] = latest_price / hist["Close"].iloc[-22] - 1
-    else:
-        mom["oneMonthReturn"] = None
-
-    if len(hist) >= 66:
-        mom["threeMonthReturn"] = latest_price / hist["Close"].iloc[-66] - 1
-    else:
-        mom["threeMonthReturn"] = None
-
-    if "High" in hist:
-        mom["high3m"] = hist["High"].tail(66).max()
-    else:
-        mom["high3m"] = None
-
-    if "Low" in hist:
-        mom["low3m"] = hist["Low"].tail(66).min()
-    else:
-        mom["low3m"] = None
-
-    # 波動度
-    mom["volatility3m"] = (
-        hist["Close"].pct_change().std() if len(hist) > 2 else None
-    )
-
-    # --- 估值 ---
-    valuation = {
-        "latestPrice": latest_price,
-        "trailingPE": info.get("trailingPE"),
-        "forwardPE": info.get("forwardPE"),
-        "priceToBook": info.get("priceToBook"),
-    }
-
-    return {
-        "valuation": valuation,
-        "momentum": mom,
-    }
+import numpy as np
+import pandas as pd
+
+
+def compute_indicators(hist: pd.DataFrame, info: dict):
+    # 所有動能指標都從同一份 numpy view 算：
+    # 免去每個指標各自建 Series（iloc / tail / pct_change）的 pandas 開銷
+    c = (
+        hist["Close"].to_numpy(dtype=np.float64, copy=False)
+        if "Close" in hist.columns
+        else np.empty(0)
+    )
+    n = c.size
+    latest_price = float(c[-1]) if n else None
+
+    # --- 動能指標 ---
+    mom = {}
+
+    mom["oneMonthReturn"] = latest_price / float(c[-22]) - 1 if n >= 22 else None
+    mom["threeMonthReturn"] = latest_price / float(c[-66]) - 1 if n >= 66 else None
+
+    # nanmax / nanmin / 遮掉 NaN：yfinance 歷史資料偶爾有缺值列，
+    # pandas 的 max/std 會自動略過，numpy 版要明講才不會整個指標變 NaN
+    if "High" in hist and n:
+        mom["high3m"] = float(np.nanmax(hist["High"].to_numpy(dtype=np.float64)[-66:]))
+    else:
+        mom["high3m"] = None
+
+    if "Low" in hist and n:
+        mom["low3m"] = float(np.nanmin(hist["Low"].to_numpy(dtype=np.float64)[-66:]))
+    else:
+        mom["low3m"] = None
+
+    # 波動度（日報酬標準差；ddof=1 對齊 pandas .std() 的結果）
+    if n > 2:
+        rets = np.diff(c) / c[:-1]
+        rets = rets[~np.isnan(rets)]
+        mom["volatility3m"] = float(np.std(rets, ddof=1)) if rets.size > 1 else None
+    else:
+        mom["volatility3m"] = None
+
+    # --- 估值 ---
+    valuation = {
+        "latestPrice": latest_price,
+        "trailingPE": info.get("trailingPE"),
+        "forwardPE": info.get("forwardPE"),
+        "priceToBook": info.get("priceToBook"),
+    }
+
+    return {
+        "valuation": valuation,
+        "momentum": mom,
+    }